@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from app.database import async_session, get_engine
+from app.seed import seed_database
+from app.users.dao import PartitionsDAO, QuizStatsDAO
+from app.users.partitions import add_months, month_start
+
+
+async def disable_statement_timeout(session):
+    # DB_STATEMENT_TIMEOUT is meant for requests, maintenance scans whole tables.
+    await session.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+async def rebuild_quiz_stats(args):
+    async with async_session() as session:
+        await disable_statement_timeout(session)
+        await QuizStatsDAO.rebuild(session, quiz_id=args.quiz_id)
+
+
+async def seed(args):
+    started = time.perf_counter()
+
+    def progress(copied: int):
+        elapsed = time.perf_counter() - started
+        print(f"Записей: {copied}/{args.records}, {elapsed:.0f} с", flush=True)
+
+    async with get_engine().connect() as connection:
+        await disable_statement_timeout(connection)
+        await seed_database(
+            connection,
+            users=args.users,
+            records=args.records,
+            quizzes=args.quizzes,
+            quiz_id_start=args.quiz_id_start,
+            quiz_skew=args.quiz_skew,
+            user_alpha=args.user_alpha,
+            days=args.days,
+            seed=args.seed,
+            progress=progress,
+        )
+        await connection.commit()
+
+    async with async_session() as session:
+        await disable_statement_timeout(session)
+        await QuizStatsDAO.rebuild(session)
+    async with get_engine().connect() as connection:
+        await disable_statement_timeout(connection)
+        await connection.execute(text("ANALYZE users, records, quiz_stats"))
+        await connection.commit()
+    print(f"Готово за {time.perf_counter() - started:.0f} с")
+
+
+async def partitions(args):
+    this_month = month_start(date.today())
+    async with async_session() as session:
+        created = await PartitionsDAO.create_partitions(
+            this_month, add_months(this_month, args.ahead), session
+        )
+        print("Созданы партиции:", ", ".join(created) or "нет")
+        if args.retain_months is not None:
+            detached = await PartitionsDAO.detach_partitions(
+                add_months(this_month, -args.retain_months), session, drop=args.drop
+            )
+            action = "Удалены партиции:" if args.drop else "Отсоединены партиции:"
+            print(action, ", ".join(detached) or "нет")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-quiz-stats", help="Пересчитать статистику квизов по таблице records"
+    )
+    rebuild.add_argument("--quiz-id", type=int, help="Пересчитать только этот квиз")
+    rebuild.set_defaults(handler=rebuild_quiz_stats)
+
+    seed_parser = commands.add_parser(
+        "seed", help="Заполнить БД сгенерированными пользователями и записями"
+    )
+    seed_parser.add_argument("--users", type=int, default=100_000)
+    seed_parser.add_argument("--records", type=int, default=10_000_000)
+    seed_parser.add_argument("--quizzes", type=int, default=5000)
+    seed_parser.add_argument("--quiz-id-start", type=int, default=1)
+    seed_parser.add_argument(
+        "--quiz-skew",
+        type=float,
+        default=1.1,
+        help="Показатель Ципфа популярности квизов",
+    )
+    seed_parser.add_argument(
+        "--user-alpha",
+        type=float,
+        default=1.2,
+        help="Показатель Парето активности пользователей (меньше - тяжелее хвост)",
+    )
+    seed_parser.add_argument(
+        "--days", type=int, default=365, help="Период распределения created_at, дней"
+    )
+    seed_parser.add_argument("--seed", type=int, default=0)
+    seed_parser.set_defaults(handler=seed)
+
+    partitions_parser = commands.add_parser(
+        "partitions", help="Создать будущие и отсоединить старые партиции records"
+    )
+    partitions_parser.add_argument(
+        "--ahead", type=int, default=3, help="На сколько месяцев вперёд создать"
+    )
+    partitions_parser.add_argument(
+        "--retain-months",
+        type=int,
+        help="Отсоединить партиции старше этого числа месяцев (остаются таблицами)",
+    )
+    partitions_parser.add_argument(
+        "--drop", action="store_true", help="Удалить отсоединённые партиции"
+    )
+    partitions_parser.set_defaults(handler=partitions)
+
+    return parser
+
+
+async def main(args):
+    try:
+        await args.handler(args)
+    finally:
+        await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(get_parser().parse_args()))
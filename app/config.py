@@ -1,6 +1,8 @@
 import os
 import string
 import random
+from functools import cached_property, lru_cache
+from typing import Callable, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -16,28 +18,230 @@ class Settings(BaseSettings):
     QUIZM_BACKEND_ADDRESS: str
     QUIZM_FRONTEND_ADDRESS: str
 
+    SQL_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT: int = 30000
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_SLOW_QUERY_THRESHOLD: float = 200.0
+    DB_QUERY_BUDGET: int = 20
+    DB_QUERY_BUDGET_STRICT: bool = False
+    DB_REPLICA_URLS: str = ""
+    DB_READ_YOUR_WRITES_WINDOW: int = 5
+
+    JWT_VERIFIED_CLAIMS: bool = True
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60.0
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    PASSWORD_HASH_RETRY_AFTER: int = 1
+    RESPONSE_CACHE_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL: float = 30.0
+    RESPONSE_CACHE_MAX_TAGS: int = 100000
+    RESPONSE_CACHE_REDIS_URL: Optional[str] = None
+    RATE_LIMIT_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    RATE_LIMIT_TRUSTED_HOPS: int = 1
+    RATE_LIMIT_AUTH_PER_MINUTE: float = 20.0
+    RATE_LIMIT_AUTH_BURST: int = 10
+    RATE_LIMIT_WRITES_PER_MINUTE: float = 600.0
+    RATE_LIMIT_WRITES_BURST: int = 60
+    WRITE_MAX_CONCURRENCY: int = 64
+    WRITE_RETRY_AFTER: int = 1
+
+    QUIZ_BACKEND_TIMEOUT: float = 5.0
+    QUIZ_BACKEND_HTTP2: bool = False
+    QUIZ_BACKEND_MAX_CONNECTIONS: int = 100
+    QUIZ_BACKEND_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    QUIZ_BACKEND_KEEPALIVE_EXPIRY: float = 30.0
+    QUIZ_NAME_CACHE_SIZE: int = 1024
+    QUIZ_NAME_CACHE_TTL: float = 300.0
+    QUIZ_NAME_RESOLVER_ENABLED: bool = False
+    QUIZ_NAME_RESOLVER_WORKERS: int = 2
+    QUIZ_NAME_RESOLVER_BATCH_SIZE: int = 100
+    QUIZ_NAME_RESOLVER_QUEUE_SIZE: int = 10000
+    QUIZ_NAME_RESOLVER_SWEEP_INTERVAL: float = 300.0
+
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8888
+    WEB_WORKERS: Optional[int] = None
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    READY_TIMEOUT: float = 2.0
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    # Read on first use instead of at import, so importing the app (tests,
+    # tooling, the server master process) does not need the environment.
+    return Settings()
+
+
+def __getattr__(name: str):
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def lazy_option(getter: Callable[[], dict], key: str) -> cached_property:
+    # Instance attribute filled from the settings on first access; it can still
+    # be assigned directly, e.g. in tests.
+    return cached_property(lambda self: getter()[key])
 
 
 def get_db_url():
+    settings = get_settings()
     return (
         f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
         f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
     )
 
 
+def get_engine_options():
+    settings = get_settings()
+    return {
+        "echo": settings.SQL_ECHO,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "statement_timeout": settings.DB_STATEMENT_TIMEOUT,
+        "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+    }
+
+
+def get_replica_options():
+    settings = get_settings()
+    return {
+        "urls": [
+            url.strip() for url in settings.DB_REPLICA_URLS.split(",") if url.strip()
+        ],
+        "read_your_writes_window": settings.DB_READ_YOUR_WRITES_WINDOW,
+    }
+
+
+def get_query_tracking_options():
+    settings = get_settings()
+    return {
+        "slow_query_threshold": settings.DB_SLOW_QUERY_THRESHOLD,
+        "budget": settings.DB_QUERY_BUDGET,
+        "strict": settings.DB_QUERY_BUDGET_STRICT,
+    }
+
+
 def get_auth_data():
-    return {"secret_key": settings.SECRET_KEY, "algorithm": settings.ALGORITHM}
+    settings = get_settings()
+    return {
+        "secret_key": settings.SECRET_KEY,
+        "algorithm": settings.ALGORITHM,
+        "verified_claims": settings.JWT_VERIFIED_CLAIMS,
+    }
+
+
+def get_password_hash_options():
+    settings = get_settings()
+    return {
+        "rounds": settings.BCRYPT_ROUNDS,
+        "executor": settings.PASSWORD_HASH_EXECUTOR,
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+        "retry_after": settings.PASSWORD_HASH_RETRY_AFTER,
+    }
+
+
+def get_user_cache_options():
+    settings = get_settings()
+    return {"maxsize": settings.USER_CACHE_SIZE, "ttl": settings.USER_CACHE_TTL}
+
+
+def get_response_cache_options():
+    settings = get_settings()
+    return {
+        "backend": settings.RESPONSE_CACHE_BACKEND,
+        "size": settings.RESPONSE_CACHE_SIZE,
+        "ttl": settings.RESPONSE_CACHE_TTL,
+        "max_tags": settings.RESPONSE_CACHE_MAX_TAGS,
+        "redis_url": settings.RESPONSE_CACHE_REDIS_URL,
+    }
+
+
+def get_rate_limit_options():
+    settings = get_settings()
+    return {
+        "backend": settings.RATE_LIMIT_BACKEND,
+        "redis_url": settings.RATE_LIMIT_REDIS_URL,
+        "max_keys": settings.RATE_LIMIT_MAX_KEYS,
+        "trust_forwarded": settings.RATE_LIMIT_TRUST_FORWARDED,
+        "trusted_hops": settings.RATE_LIMIT_TRUSTED_HOPS,
+        "auth_per_minute": settings.RATE_LIMIT_AUTH_PER_MINUTE,
+        "auth_burst": settings.RATE_LIMIT_AUTH_BURST,
+        "writes_per_minute": settings.RATE_LIMIT_WRITES_PER_MINUTE,
+        "writes_burst": settings.RATE_LIMIT_WRITES_BURST,
+        "record_writes_max_concurrency": settings.WRITE_MAX_CONCURRENCY,
+        "record_writes_retry_after": settings.WRITE_RETRY_AFTER,
+    }
+
+
+def get_server_options():
+    settings = get_settings()
+    workers = settings.WEB_WORKERS
+    if workers is None:
+        # CPUs this process may run on, which respects taskset/cpuset limits.
+        workers = (
+            len(os.sched_getaffinity(0))
+            if hasattr(os, "sched_getaffinity")
+            else (os.cpu_count() or 1)
+        )
+    return {
+        "host": settings.WEB_HOST,
+        "port": settings.WEB_PORT,
+        "workers": workers,
+        "graceful_timeout": settings.WEB_GRACEFUL_TIMEOUT,
+        "ready_timeout": settings.READY_TIMEOUT,
+    }
 
 
 def get_origins():
+    settings = get_settings()
     return ["http://" + origin for origin in [settings.QUIZM_FRONTEND_ADDRESS]]
 
 
 def get_quiz_backend_address():
+    settings = get_settings()
     return settings.QUIZM_BACKEND_ADDRESS
+
+
+def get_quiz_backend_options():
+    settings = get_settings()
+    return {
+        "timeout": settings.QUIZ_BACKEND_TIMEOUT,
+        "http2": settings.QUIZ_BACKEND_HTTP2,
+        "max_connections": settings.QUIZ_BACKEND_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.QUIZ_BACKEND_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": settings.QUIZ_BACKEND_KEEPALIVE_EXPIRY,
+        "cache_size": settings.QUIZ_NAME_CACHE_SIZE,
+        "cache_ttl": settings.QUIZ_NAME_CACHE_TTL,
+    }
+
+
+def get_quiz_name_resolver_options():
+    settings = get_settings()
+    return {
+        "enabled": settings.QUIZ_NAME_RESOLVER_ENABLED,
+        "workers": settings.QUIZ_NAME_RESOLVER_WORKERS,
+        "batch_size": settings.QUIZ_NAME_RESOLVER_BATCH_SIZE,
+        "queue_size": settings.QUIZ_NAME_RESOLVER_QUEUE_SIZE,
+        "sweep_interval": settings.QUIZ_NAME_RESOLVER_SWEEP_INTERVAL,
+    }
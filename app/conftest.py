@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.config import get_db_url
+from app.database import query_tracker
+from app.rate_limit import MemoryBackend, rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def strict_query_budget(monkeypatch):
+    monkeypatch.setattr(query_tracker, "strict", True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backend", MemoryBackend(max_keys=1000))
+
+
+@pytest.fixture
+async def session_factory():
+    engine_test = create_async_engine(get_db_url())
+    async with engine_test.connect() as connection:
+        trans = await connection.begin()
+        yield async_sessionmaker(bind=connection, expire_on_commit=False)
+        await trans.rollback()
+    await engine_test.dispose()
+
+
+@pytest.fixture
+async def session(session_factory):
+    async with session_factory() as session:
+        yield session
@@ -1,16 +1,234 @@
+import logging
+import random
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
     AsyncAttrs,
+    AsyncEngine,
     AsyncSession,
 )
 from sqlalchemy.orm import DeclarativeBase, declared_attr
 from sqlalchemy import Column, Integer, String
-from app.config import get_db_url
+from app.config import (
+    get_db_url,
+    get_engine_options,
+    get_query_tracking_options,
+    get_replica_options,
+    lazy_option,
+)
+from app.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+def create_engine(url: Optional[str] = None):
+    options = get_engine_options()
+    url = make_url(url or get_db_url()).set(drivername="postgresql+asyncpg")
+    url = url.update_query_dict(
+        {"prepared_statement_cache_size": str(options["prepared_statement_cache_size"])}
+    )
+    return create_async_engine(
+        url,
+        echo=options["echo"],
+        pool_size=options["pool_size"],
+        max_overflow=options["max_overflow"],
+        pool_timeout=options["pool_timeout"],
+        pool_recycle=options["pool_recycle"],
+        pool_pre_ping=options["pool_pre_ping"],
+        connect_args={
+            "server_settings": {"statement_timeout": str(options["statement_timeout"])}
+        },
+    )
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestQueries:
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.statements = StatementCounter()
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return route.path if route is not None else self.scope["path"]
+
+
+request_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "request_queries", default=None
+)
+
+db_slow_queries = Counter(
+    "db_slow_queries_total", "Queries over the slow query threshold", ["route"]
+)
+db_request_queries = Histogram(
+    "db_request_queries",
+    "Queries issued per request",
+    ["route"],
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+db_query_budget_exceeded = Counter(
+    "db_query_budget_exceeded_total", "Requests over the query budget", ["route"]
+)
+
+
+class QueryTracker:
+    slow_query_threshold = lazy_option(
+        get_query_tracking_options, "slow_query_threshold"
+    )
+    budget = lazy_option(get_query_tracking_options, "budget")
+    strict = lazy_option(get_query_tracking_options, "strict")
+
+    def install(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, *args):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        queries = request_queries.get()
+        route = queries.route if queries is not None else None
+        if elapsed * 1000 > self.slow_query_threshold:
+            db_slow_queries.inc(str(route))
+            logger.warning(
+                "Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, statement
+            )
+        if queries is None:
+            return
+
+        queries.count += 1
+        queries.duration += elapsed
+        queries.statements[statement] += 1
+        if self.strict and queries.count > self.budget:
+            raise QueryBudgetExceeded(self.describe(queries))
+
+    def describe(self, queries: RequestQueries) -> str:
+        statement, repeats = queries.statements.most_common(1)[0]
+        return (
+            f"{queries.route} issued {queries.count} queries "
+            f"(budget {self.budget}), most repeated ({repeats}x): {statement}"
+        )
+
+    def finish(self, queries: RequestQueries) -> None:
+        if not queries.count:
+            return
+        db_request_queries.observe(queries.count, queries.route)
+        if queries.count > self.budget:
+            db_query_budget_exceeded.inc(queries.route)
+            logger.warning("Query budget exceeded: %s", self.describe(queries))
+
+
+query_tracker = QueryTracker()
+
 
-SQLALCHEMY_DATABASE_URL = get_db_url()
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+class QueryTrackingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries(scope)
+        token = request_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_queries.reset(token)
+            query_tracker.finish(queries)
+
+
+@lru_cache
+def get_engine() -> AsyncEngine:
+    # Built on first use (normally the lifespan hook), not at import.
+    engine = create_engine()
+    query_tracker.install(engine.sync_engine)
+    return engine
+
+
+@lru_cache
+def get_sessionmaker() -> async_sessionmaker:
+    return async_sessionmaker(get_engine(), expire_on_commit=False)
+
+
+def async_session() -> AsyncSession:
+    return get_sessionmaker()()
+
+
+@lru_cache
+def get_replica_engines() -> tuple[AsyncEngine, ...]:
+    engines = tuple(create_engine(url) for url in get_replica_options()["urls"])
+    for engine in engines:
+        query_tracker.install(engine.sync_engine)
+    return engines
+
+
+@lru_cache
+def get_replica_sessionmakers() -> tuple[async_sessionmaker, ...]:
+    return tuple(
+        async_sessionmaker(engine, expire_on_commit=False)
+        for engine in get_replica_engines()
+    )
+
+
+def get_read_sessionmaker() -> async_sessionmaker:
+    # Reads are spread over the replicas, or go to the primary without them.
+    replicas = get_replica_sessionmakers()
+    return random.choice(replicas) if replicas else get_sessionmaker()
+
+
+def read_session() -> AsyncSession:
+    return get_read_sessionmaker()()
+
+
+async def open_engine():
+    # Forget connections inherited from a parent process without closing them
+    # under it, so each worker starts with its own pool.
+    for engine in (get_engine(), *get_replica_engines()):
+        await engine.dispose(close=False)
+
+
+async def close_engine():
+    for engine in (get_engine(), *get_replica_engines()):
+        await engine.dispose()
+
+
+async def ping_database():
+    async with get_engine().connect() as connection:
+        await connection.exec_driver_sql("SELECT 1")
+
+
+def get_pool_status() -> dict:
+    pool = get_engine().pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": get_engine_options()["max_overflow"],
+    }
+
+
+Gauge(
+    "db_pool_connections",
+    "Database connection pool state",
+    ["state"],
+    collect=lambda: {(state,): value for state, value in get_pool_status().items()},
+)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -1,14 +1,25 @@
+import asyncio
 from datetime import datetime, timezone
 
-import httpx
-from jose import jwt, JWTError
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.config import get_auth_data, get_quiz_backend_address
-from app.database import async_session
-from fastapi import Request, HTTPException, status, Depends
-
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_auth_data, get_replica_options
+from app.database import (
+    async_session,
+    get_read_sessionmaker,
+    get_replica_sessionmakers,
+    get_sessionmaker,
+    read_session,
+)
+from app.metrics import span
+from app.quiz_backend import quiz_backend
+from app.response_cache import fills_response_cache
+from fastapi import Request, Response, HTTPException, status, Depends
+
+from app.users.cache import get_user_cache
 from app.users.dao import UsersDAO
+from app.users.models import User
+from app.users.schemas import UserPrincipal
 
 
 async def get_session() -> AsyncSession:
@@ -17,6 +28,57 @@ async def get_session() -> AsyncSession:
     await session.close()
 
 
+def get_session_factory() -> async_sessionmaker:
+    # Streaming responses outlive request dependencies, so they open their own
+    # session while the body is being sent.
+    return get_sessionmaker()
+
+
+READ_PRIMARY_COOKIE = "read_primary"
+
+
+def reads_primary(request: Request) -> bool:
+    # Without replicas everything is on the primary; with them, a client that
+    # has just written keeps reading the primary until its cookie expires, and
+    # cached endpoints render the pages they store from the primary.
+    if not get_replica_sessionmakers():
+        return True
+    return READ_PRIMARY_COOKIE in request.cookies or fills_response_cache(request)
+
+
+async def get_read_session(
+    request: Request, session: AsyncSession = Depends(get_session)
+) -> AsyncSession:
+    if reads_primary(request):
+        yield session
+        return
+    async with read_session() as session:
+        yield session
+
+
+def get_read_session_factory(
+    request: Request,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+) -> async_sessionmaker:
+    if reads_primary(request):
+        return session_factory
+    return get_read_sessionmaker()
+
+
+def read_your_writes(response: Response) -> Response:
+    if get_replica_sessionmakers():
+        response.set_cookie(
+            key=READ_PRIMARY_COOKIE,
+            value="1",
+            max_age=get_replica_options()["read_your_writes_window"],
+            httponly=True,
+            # Sent back by the frontend's cross-site requests, like the token.
+            samesite="none",
+            secure=True,
+        )
+    return response
+
+
 def get_token(request: Request):
     token = request.cookies.get("users_access_token")
     if not token:
@@ -26,14 +88,15 @@ def get_token(request: Request):
     return token
 
 
-async def get_active_user(
-    token: str = Depends(get_token), session: AsyncSession = Depends(get_session)
-):
+def get_token_payload(token: str = Depends(get_token)) -> dict:
+    from jose import JWTError, jwt
+
     try:
         auth_data = get_auth_data()
-        payload = jwt.decode(
-            token, auth_data["secret_key"], algorithms=[auth_data["algorithm"]]
-        )
+        with span("jwt_decode"):
+            payload = jwt.decode(
+                token, auth_data["secret_key"], algorithms=[auth_data["algorithm"]]
+            )
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Токен не валидный!"
@@ -52,7 +115,15 @@ async def get_active_user(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Не найден ID пользователя"
         )
 
-    user = await UsersDAO.get_user_by_id(int(user_id), session)
+    return payload
+
+
+async def get_fresh_user(
+    payload: dict = Depends(get_token_payload),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    with span("user_lookup"):
+        user = await UsersDAO.get_user_by_id(int(payload["sub"]), session)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
@@ -61,20 +132,50 @@ async def get_active_user(
     return user
 
 
+async def get_active_user(
+    payload: dict = Depends(get_token_payload),
+    session: AsyncSession = Depends(get_session),
+) -> UserPrincipal:
+    # Tokens issued by create_access_token carry signed username and email
+    # claims, so the users row is only read for tokens issued without them.
+    if get_auth_data()["verified_claims"] and "username" in payload:
+        return UserPrincipal(
+            id=int(payload["sub"]),
+            username=payload["username"],
+            email=payload["email"],
+        )
+
+    async def load_user():
+        return UserPrincipal.model_validate(await get_fresh_user(payload, session))
+
+    with span("active_user"):
+        return await get_user_cache().get_or_load(int(payload["sub"]), load_user)
+
+
 async def set_quiz_name(record: dict):
     try:
-        address = (
-            "http://"
-            + get_quiz_backend_address()
-            + "/api/v1/quizzes/"
-            + str(record["quiz_id"])
-        )
-        async with httpx.AsyncClient() as client:
-            response = await client.get(address)
-            response = response.json()
-            record.update({"quiz_name": response["name"]})
+        with span("set_quiz_name"):
+            quiz_name = await quiz_backend.get_quiz_name(record["quiz_id"])
+        record.update({"quiz_name": quiz_name})
 
     except Exception as e:
         record.update({"quiz_name": ""})
 
     return record
+
+
+async def set_quiz_names(records: list[dict]):
+    quiz_ids = list({record["quiz_id"] for record in records})
+    with span("set_quiz_names"):
+        quiz_names = await asyncio.gather(
+            *(quiz_backend.get_quiz_name(quiz_id) for quiz_id in quiz_ids),
+            return_exceptions=True,
+        )
+    quiz_names = {
+        quiz_id: "" if isinstance(quiz_name, BaseException) else quiz_name
+        for quiz_id, quiz_name in zip(quiz_ids, quiz_names)
+    }
+    for record in records:
+        record.update({"quiz_name": quiz_names[record["quiz_id"]]})
+
+    return records
@@ -5,24 +5,62 @@ from fastapi import FastAPI
 from fastapi.encoders import jsonable_encoder
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from .config import get_origins
+from .database import QueryTrackingMiddleware, close_engine, open_engine
+from .metrics import MetricsMiddleware, router as router_metrics
+from .quiz_backend import quiz_backend
+from .rate_limit import rate_limiter
+from .response_cache import response_cache
+from .service import router as router_service
+from .users.auth import password_hasher
+from .users.resolver import quiz_name_resolver
 from .users.router import router as router_users, router_records
 from .database import *
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker process after it has been started, so pools and
+    # clients are never shared between workers.
+    await open_engine()
+    quiz_backend.start()
+    if quiz_name_resolver.enabled:
+        quiz_name_resolver.start()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await quiz_name_resolver.stop()
+    await quiz_backend.close()
+    password_hasher.shutdown()
+    await response_cache.close()
+    await rate_limiter.close()
+    await close_engine()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(router_users)
 app.include_router(router_records)
+app.include_router(router_service)
+app.include_router(router_metrics)
+
+
+def cors_middleware(app):
+    # Starlette builds the middleware stack on the first request or lifespan
+    # event, so the origins are read from the settings only then.
+    return CORSMiddleware(
+        app,
+        allow_origins=get_origins(),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-origins = get_origins()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(cors_middleware)
+app.add_middleware(QueryTrackingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.exception_handler(404)
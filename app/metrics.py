@@ -0,0 +1,241 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Sequence
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names: Sequence[str], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.register(self)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    # `collect` works as for Gauge, for totals counted by another component.
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple, float] = {}
+        self.collect = collect
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        values = self.collect() if self.collect is not None else self.values
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    # `collect` is called at scrape time and returns {label values: value}, for
+    # numbers owned by another component (pool sizes, queue depths).
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple, float] = {}
+        self.collect = collect
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> list[str]:
+        values = self.collect() if self.collect is not None else self.values
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        counts = self.values.get(labels)
+        if counts is None:
+            # Per bucket counts, then sum and count.
+            counts = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, counts in self.values.items():
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                le = format_labels(self.labels, key, f'le="{format_value(bucket)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"]
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being processed", ["method"]
+)
+
+
+def cache_metrics(name: str, documentation: str, get_cache: Callable[[], Any]):
+    # Exports TTLCache.stats() of the cache returned by get_cache at scrape time.
+    Counter(
+        f"{name}_lookups_total",
+        f"{documentation} lookups by result",
+        ["result"],
+        collect=lambda: {
+            ("hit",): get_cache().stats()["hits"],
+            ("miss",): get_cache().stats()["misses"],
+        },
+    )
+    Gauge(
+        f"{name}_entries",
+        f"{documentation} entries",
+        collect=lambda: {(): get_cache().stats()["size"]},
+    )
+    Gauge(
+        f"{name}_max_entries",
+        f"{documentation} capacity",
+        collect=lambda: {(): get_cache().stats()["maxsize"]},
+    )
+
+
+span_duration = Histogram(
+    "span_duration_seconds", "Duration of named stages of a request", ["span"]
+)
+
+
+def span(name: str):
+    return span_duration.time(name)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(method)
+            # Label by the route template, not the raw path, to bound cardinality.
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_request_duration.observe(elapsed, method, route)
+            http_requests.inc(method, route, str(status_code))
+
+
+router = APIRouter(tags=["Служебное"])
+
+
+@router.get("/metrics", summary="Получить метрики в формате Prometheus")
+async def get_metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
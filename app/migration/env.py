@@ -16,6 +16,7 @@ sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
 from app.database import Base
 from app.users.models import User, Record
+from app.users.partitions import DEFAULT_PARTITION, partition_month
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -36,6 +37,20 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def is_records_partition(table_name: str) -> bool:
+    return table_name == DEFAULT_PARTITION or partition_month(table_name) is not None
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Monthly partitions of records are created by `python -m app.cli partitions`,
+    # not by migrations, so autogenerate must not drop them or their indexes.
+    if type_ == "table" and reflected and compare_to is None:
+        return not is_records_partition(name)
+    if type_ in ("index", "unique_constraint", "foreign_key_constraint"):
+        return not is_records_partition(object.table.name)
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -52,6 +67,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -61,7 +77,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,42 @@
+"""'add_unnamed_records_index'
+
+Revision ID: 588bb28e8822
+Revises: 30c90bb0b02d
+Create Date: 2026-10-18 15:40:12.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "588bb28e8822"
+down_revision: Union[str, None] = "30c90bb0b02d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction and keeps records writable.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_records_unnamed_quiz_id",
+            "records",
+            ["quiz_id"],
+            unique=False,
+            postgresql_where=sa.text("quiz_name IS NULL OR quiz_name = ''"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_records_unnamed_quiz_id",
+            table_name="records",
+            postgresql_where=sa.text("quiz_name IS NULL OR quiz_name = ''"),
+            postgresql_concurrently=True,
+        )
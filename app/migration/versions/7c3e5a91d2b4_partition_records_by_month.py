@@ -0,0 +1,130 @@
+"""'partition_records_by_month'
+
+Revision ID: 7c3e5a91d2b4
+Revises: e42be1954705
+Create Date: 2026-10-18 18:12:40.518302
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.users.partitions import (
+    add_months,
+    create_default_partition_query,
+    create_partition_query,
+    month_start,
+    months,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3e5a91d2b4"
+down_revision: Union[str, None] = "e42be1954705"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months pre-created after the current one, later `python -m app.cli partitions`.
+PARTITIONS_AHEAD = 2
+
+COLUMNS = "id, user_id, quiz_id, score, created_at, quiz_name"
+
+
+def create_records_table(*constraints, **kwargs) -> None:
+    op.create_table(
+        "records",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('records_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("quiz_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("quiz_name", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        *constraints,
+        **kwargs,
+    )
+
+
+def create_records_indexes() -> None:
+    op.create_index(
+        "ix_records_user_id_created_at_id",
+        "records",
+        ["user_id", sa.text("created_at DESC"), "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_records_quiz_id_score_id",
+        "records",
+        ["quiz_id", sa.text("score DESC"), "id"],
+        unique=False,
+        postgresql_include=["user_id", "quiz_name", "created_at"],
+    )
+    op.create_index(
+        "ix_records_unnamed_quiz_id",
+        "records",
+        ["quiz_id"],
+        unique=False,
+        postgresql_where=sa.text("quiz_name IS NULL OR quiz_name = ''"),
+    )
+
+
+def rename_old_records() -> None:
+    # Keeps the rows and the id sequence while the new table takes the name.
+    op.rename_table("records", "records_old")
+    op.execute("ALTER SEQUENCE records_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE records_old DROP CONSTRAINT records_pkey")
+    op.execute("ALTER TABLE records_old DROP CONSTRAINT records_user_id_fkey")
+    op.drop_index("ix_records_user_id_created_at_id", table_name="records_old")
+    op.drop_index("ix_records_quiz_id_score_id", table_name="records_old")
+    op.drop_index("ix_records_unnamed_quiz_id", table_name="records_old")
+
+
+def move_old_records() -> None:
+    op.execute(f"INSERT INTO records ({COLUMNS}) SELECT {COLUMNS} FROM records_old")
+    op.drop_table("records_old")
+    op.execute("ALTER SEQUENCE records_id_seq OWNED BY records.id")
+
+
+def upgrade() -> None:
+    # Copies the whole table: run in a maintenance window on large databases.
+    rename_old_records()
+    create_records_table(
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+
+    first = op.get_bind().execute(sa.text("SELECT min(created_at) FROM records_old"))
+    first = first.scalar_one() or date.today()
+    last = add_months(month_start(date.today()), PARTITIONS_AHEAD)
+    for month in months(first, last):
+        op.execute(create_partition_query(month))
+    op.execute(create_default_partition_query())
+
+    move_old_records()
+    create_records_indexes()
+
+
+def downgrade() -> None:
+    rename_old_records()
+    op.execute("ALTER TABLE records_old RENAME TO records_partitioned")
+    create_records_table(sa.PrimaryKeyConstraint("id"))
+    op.execute(
+        f"INSERT INTO records ({COLUMNS}) SELECT {COLUMNS} FROM records_partitioned"
+    )
+    # Dropping the partitioned table drops all of its partitions.
+    op.drop_table("records_partitioned")
+    op.execute("ALTER SEQUENCE records_id_seq OWNED BY records.id")
+    create_records_indexes()
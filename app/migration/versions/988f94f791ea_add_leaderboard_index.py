@@ -0,0 +1,41 @@
+"""'add_leaderboard_index'
+
+Revision ID: 988f94f791ea
+Revises: 588bb28e8822
+Create Date: 2026-10-18 16:02:47.905113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "988f94f791ea"
+down_revision: Union[str, None] = "588bb28e8822"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction and keeps records writable.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_records_quiz_id_score_id",
+            "records",
+            ["quiz_id", sa.text("score DESC"), "id"],
+            unique=False,
+            postgresql_include=["user_id", "quiz_name", "created_at"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_records_quiz_id_score_id",
+            table_name="records",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,35 @@
+"""'add_record_idempotency_keys'
+
+Revision ID: b4d2f6a8c1e3
+Revises: 7c3e5a91d2b4
+Create Date: 2026-10-18 19:02:17.204611
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b4d2f6a8c1e3"
+down_revision: Union[str, None] = "7c3e5a91d2b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "record_idempotency_keys",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("record_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("record_idempotency_keys")
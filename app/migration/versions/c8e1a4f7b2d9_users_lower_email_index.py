@@ -0,0 +1,35 @@
+"""'users_lower_email_index'
+
+Revision ID: c8e1a4f7b2d9
+Revises: b4d2f6a8c1e3
+Create Date: 2026-10-18 19:41:05.873120
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c8e1a4f7b2d9"
+down_revision: Union[str, None] = "b4d2f6a8c1e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if existing emails differ only in case: merge those users first.
+    op.create_index(
+        "ix_users_lower_email",
+        "users",
+        [sa.text("lower(email)")],
+        unique=True,
+    )
+    op.drop_constraint("users_email_key", "users", type_="unique")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint("users_email_key", "users", ["email"])
+    op.drop_index("ix_users_lower_email", table_name="users")
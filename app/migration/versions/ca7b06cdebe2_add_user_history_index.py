@@ -0,0 +1,39 @@
+"""'add_user_history_index'
+
+Revision ID: ca7b06cdebe2
+Revises: 988f94f791ea
+Create Date: 2026-10-18 16:24:05.671390
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "ca7b06cdebe2"
+down_revision: Union[str, None] = "988f94f791ea"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_records_user_id_created_at_id",
+            "records",
+            ["user_id", sa.text("created_at DESC"), "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_records_user_id_created_at_id",
+            table_name="records",
+            postgresql_concurrently=True,
+        )
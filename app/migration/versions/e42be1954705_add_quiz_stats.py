@@ -0,0 +1,37 @@
+"""'add_quiz_stats'
+
+Revision ID: e42be1954705
+Revises: ca7b06cdebe2
+Create Date: 2026-10-18 17:05:31.442871
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e42be1954705"
+down_revision: Union[str, None] = "ca7b06cdebe2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fill the table with `python -m app.cli rebuild-quiz-stats` after deploy.
+    op.create_table(
+        "quiz_stats",
+        sa.Column("quiz_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("attempts", sa.BigInteger(), nullable=False),
+        sa.Column("score_sum", sa.BigInteger(), nullable=False),
+        sa.Column("best_score", sa.Integer(), nullable=False),
+        sa.Column("histogram", postgresql.ARRAY(sa.BigInteger()), nullable=False),
+        sa.PrimaryKeyConstraint("quiz_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("quiz_stats")
@@ -0,0 +1,79 @@
+from functools import cached_property
+from typing import TYPE_CHECKING, Optional
+
+from app.cache import TTLCache
+from app.config import get_quiz_backend_address, get_quiz_backend_options
+
+if TYPE_CHECKING:
+    import httpx
+from app.metrics import Counter, Histogram, cache_metrics
+
+quiz_backend_request_duration = Histogram(
+    "quiz_backend_request_duration_seconds", "Quiz backend request latency"
+)
+quiz_backend_errors = Counter(
+    "quiz_backend_errors_total", "Failed quiz backend requests", ["error"]
+)
+
+
+class QuizBackendClient:
+    def __init__(self):
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @cached_property
+    def _options(self) -> dict:
+        return get_quiz_backend_options()
+
+    @cached_property
+    def names(self) -> TTLCache:
+        return TTLCache(
+            maxsize=self._options["cache_size"], ttl=self._options["cache_ttl"]
+        )
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            self.start()
+        return self._client
+
+    def start(self, transport: Optional["httpx.AsyncBaseTransport"] = None) -> None:
+        if self._client is not None:
+            return
+        import httpx
+
+        options = self._options
+        self._client = httpx.AsyncClient(
+            base_url="http://" + get_quiz_backend_address(),
+            http2=options["http2"],
+            timeout=options["timeout"],
+            limits=httpx.Limits(
+                max_connections=options["max_connections"],
+                max_keepalive_connections=options["max_keepalive_connections"],
+                keepalive_expiry=options["keepalive_expiry"],
+            ),
+            transport=transport,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_quiz_name(self, quiz_id: int) -> str:
+        try:
+            with quiz_backend_request_duration.time():
+                response = await self.client.get(f"/api/v1/quizzes/{quiz_id}")
+            response.raise_for_status()
+            return response.json()["name"]
+        except Exception as e:
+            quiz_backend_errors.inc(type(e).__name__)
+            raise
+
+    async def get_quiz_name(self, quiz_id: int) -> str:
+        return await self.names.get_or_load(
+            quiz_id, lambda: self.fetch_quiz_name(quiz_id)
+        )
+
+
+quiz_backend = QuizBackendClient()
+cache_metrics("quiz_name_cache", "Quiz name cache", lambda: quiz_backend.names)
@@ -0,0 +1,195 @@
+import math
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app.config import get_rate_limit_options
+from app.dependencies import get_active_user
+from app.metrics import Counter, Gauge
+from app.users.schemas import UserPrincipal
+
+rate_limited = Counter(
+    "rate_limited_total", "Requests rejected by a rate limit", ["limit"]
+)
+overloaded = Counter(
+    "overloaded_total", "Requests rejected by a concurrency limit", ["limit"]
+)
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # Evicted clients start over with a full bucket.
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    # Refill and take in one script, on the Redis clock, so all workers share
+    # the bucket without races or clock skew.
+    script = """
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, client, prefix: str = "rate-limit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        wait = await self.client.eval(self.script, 1, self.prefix + key, rate, burst)
+        return float(wait)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_backend(options: dict):
+    if options["backend"] == "memory":
+        return MemoryBackend(max_keys=options["max_keys"])
+    if options["backend"] == "redis":
+        import redis.asyncio
+
+        return RedisBackend(redis.asyncio.from_url(options["redis_url"]))
+    return None
+
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        if backend is not None:
+            self.backend = backend
+
+    @cached_property
+    def backend(self):
+        # Picked from the settings on first use; None disables rate limiting.
+        return create_backend(get_rate_limit_options())
+
+    async def check(self, name: str, key: str, per_minute: float, burst: int):
+        if self.backend is None:
+            return
+        wait = await self.backend.take(f"{name}:{key}", per_minute / 60, burst)
+        if wait > 0:
+            rate_limited.inc(name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов, повторите попытку позже",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+rate_limiter = RateLimiter()
+
+
+def get_client_ip(request: Request) -> str:
+    options = get_rate_limit_options()
+    if options["trust_forwarded"]:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # Each proxy appends the address it was connected from, and the
+            # client controls everything before that: count trusted hops
+            # from the right.
+            hops = forwarded.split(",")
+            return hops[-min(options["trusted_hops"], len(hops))].strip()
+    return request.client.host if request.client else "unknown"
+
+
+# Limits are read from the "<name>_per_minute" and "<name>_burst" options.
+def limit_by_ip(name: str):
+    async def dependency(request: Request):
+        options = get_rate_limit_options()
+        await rate_limiter.check(
+            name,
+            get_client_ip(request),
+            options[f"{name}_per_minute"],
+            options[f"{name}_burst"],
+        )
+
+    return dependency
+
+
+def limit_by_user(name: str):
+    async def dependency(user_data: UserPrincipal = Depends(get_active_user)):
+        options = get_rate_limit_options()
+        await rate_limiter.check(
+            name,
+            str(user_data.id),
+            options[f"{name}_per_minute"],
+            options[f"{name}_burst"],
+        )
+
+    return dependency
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name: str):
+        self.name = name
+        self.active = 0
+        Gauge(
+            f"{name}_active",
+            f"Requests holding a {name} slot",
+            collect=lambda: {(): self.active},
+        )
+
+    @cached_property
+    def limit(self) -> int:
+        return get_rate_limit_options()[f"{self.name}_max_concurrency"]
+
+    @cached_property
+    def retry_after(self) -> int:
+        return get_rate_limit_options()[f"{self.name}_retry_after"]
+
+    async def __call__(self):
+        if self.active >= self.limit:
+            overloaded.inc(self.name)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+
+limit_auth = limit_by_ip("auth")
+limit_writes = limit_by_user("writes")
+write_slots = ConcurrencyLimiter("record_writes")
@@ -0,0 +1,163 @@
+import functools
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+
+from app.cache import TTLCache
+from app.config import get_response_cache_options
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl: float, max_tags: int = 100000):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.max_tags = max_tags
+        self.versions: OrderedDict[str, int] = OrderedDict()
+        # Version of every tag not in `versions`. It is raised above the version
+        # of each evicted tag, so tag versions never go back and entries cached
+        # before an eviction can not match again.
+        self.epoch = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.entries.set(key, value)
+
+    def version(self, tag: str) -> int:
+        if tag not in self.versions:
+            return self.epoch
+        self.versions.move_to_end(tag)
+        return self.versions[tag]
+
+    async def get_versions(self, tags: list[str]) -> list[int]:
+        return [self.version(tag) for tag in tags]
+
+    async def bump(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            self.versions[tag] = self.version(tag) + 1
+            if len(self.versions) > self.max_tags:
+                _, evicted = self.versions.popitem(last=False)
+                self.epoch = max(self.epoch, evicted + 1)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    # Works with any client exposing the redis.asyncio get/set/mget/incr API.
+    def __init__(self, client, ttl: float, prefix: str = "response-cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(self.prefix + key, value, ex=max(int(self.ttl), 1))
+
+    async def get_versions(self, tags: list[str]) -> list[int]:
+        versions = await self.client.mget([self.prefix + "v:" + tag for tag in tags])
+        return [int(version or 0) for version in versions]
+
+    async def bump(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            await self.client.incr(self.prefix + "v:" + tag)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_backend(options: dict):
+    if options["backend"] == "memory":
+        return MemoryBackend(
+            maxsize=options["size"], ttl=options["ttl"], max_tags=options["max_tags"]
+        )
+    if options["backend"] == "redis":
+        import redis.asyncio
+
+        client = redis.asyncio.from_url(options["redis_url"])
+        return RedisBackend(client, ttl=options["ttl"])
+    return None
+
+
+class ResponseCache:
+    # Keys embed the current version of every tag of the response, so a write
+    # invalidates all cached pages of a user or quiz by bumping one counter.
+    def __init__(self, backend=None):
+        if backend is not None:
+            self.backend = backend
+
+    @functools.cached_property
+    def backend(self):
+        # Picked from the settings on first use; None disables the cache.
+        return create_backend(get_response_cache_options())
+
+    async def respond(
+        self,
+        request: Request,
+        tags: list[str],
+        build: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        if self.backend is None:
+            return await build()
+
+        versions = await self.backend.get_versions(tags)
+        key = f"{request.url.path}?{request.url.query}|{versions}"
+        cached = await self.backend.get(key)
+        if cached is None:
+            response = await build()
+            if response.status_code != 200:
+                return response
+            body = response.body
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            await self.backend.set(key, etag.encode() + b"\n" + body)
+        else:
+            etag, body = cached.split(b"\n", 1)
+            etag = etag.decode()
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *tags: str) -> None:
+        if self.backend is not None:
+            await self.backend.bump(tags)
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+response_cache = ResponseCache()
+
+
+def fills_response_cache(request: Request) -> bool:
+    # Cached pages are shared by all clients and stored under the tag versions
+    # read before rendering, so they must not come from a lagging replica.
+    endpoint = request.scope.get("endpoint")
+    return response_cache.backend is not None and getattr(
+        endpoint, "cached_response", False
+    )
+
+
+def cached_response(*tags: str):
+    # Endpoint must take `request: Request` and return a rendered Response;
+    # tags are formatted with the endpoint's arguments, e.g. "quiz:{quiz_id}".
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs):
+            return await response_cache.respond(
+                kwargs["request"],
+                [tag.format(**kwargs) for tag in tags],
+                lambda: endpoint(**kwargs),
+            )
+
+        wrapper.cached_response = True
+        return wrapper
+
+    return decorator
@@ -0,0 +1,124 @@
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.users.auth import get_password_hash
+from app.users.models import Record, User
+from app.users.partitions import (
+    create_partitions_queries,
+    list_partitions_query,
+    months,
+    partition_name,
+)
+
+SEED_PASSWORD = "12s34f5g6"
+SEED_EMAIL_DOMAIN = "seed.quizm.ru"
+SEED_BATCH_SIZE = 100_000
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    # Quiz k (1-based) is picked with probability proportional to 1 / k**skew.
+    return list(accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def pareto_weights(count: int, alpha: float, rng: random.Random) -> list[float]:
+    # Heavy tail: a small share of users submits most of the attempts.
+    return list(accumulate(rng.paretovariate(alpha) for _ in range(count)))
+
+
+def generate_records(
+    count: int,
+    user_ids: list[int],
+    quiz_ids: list[int],
+    quiz_skew: float,
+    user_alpha: float,
+    days: int,
+    rng: random.Random,
+) -> Iterator[list[tuple]]:
+    quiz_weights = zipf_weights(len(quiz_ids), quiz_skew)
+    user_weights = pareto_weights(len(user_ids), user_alpha, rng)
+    # Popular quizzes are not necessarily the lowest ids.
+    quiz_ids = rng.sample(quiz_ids, len(quiz_ids))
+    # records.created_at is a naive timestamp filled by now() on the server.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    span = days * 86400
+
+    for start in range(0, count, SEED_BATCH_SIZE):
+        size = min(SEED_BATCH_SIZE, count - start)
+        quizzes = rng.choices(quiz_ids, cum_weights=quiz_weights, k=size)
+        users = rng.choices(user_ids, cum_weights=user_weights, k=size)
+        yield [
+            (
+                user_id,
+                quiz_id,
+                f"Quiz {quiz_id}",
+                min(int(rng.triangular(0, 100, 70)), 99),
+                now - timedelta(seconds=rng.random() * span),
+            )
+            for user_id, quiz_id in zip(users, quizzes)
+        ]
+
+
+async def seed_database(
+    connection: AsyncConnection,
+    users: int,
+    records: int,
+    quizzes: int,
+    quiz_id_start: int = 1,
+    quiz_skew: float = 1.1,
+    user_alpha: float = 1.2,
+    days: int = 365,
+    seed: int = 0,
+    progress: Optional[Callable[[int], None]] = None,
+) -> list[int]:
+    rng = random.Random(seed)
+    # Reserve ids from the sequence so the copied users keep it consistent.
+    result = await connection.execute(
+        text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+            "FROM generate_series(1, :count)"
+        ),
+        {"table": User.__tablename__, "count": users},
+    )
+    user_ids = result.scalars().all()
+    raw_connection = (await connection.get_raw_connection()).driver_connection
+
+    password = get_password_hash(SEED_PASSWORD)
+    await raw_connection.copy_records_to_table(
+        User.__tablename__,
+        records=(
+            (id, f"seed{id}", f"seed{id}@{SEED_EMAIL_DOMAIN}", password)
+            for id in user_ids
+        ),
+        columns=["id", "username", "email", "password"],
+    )
+
+    # Spread rows land in their monthly partitions instead of the default one.
+    today = datetime.now(timezone.utc).date()
+    existing = set((await connection.execute(text(list_partitions_query()))).scalars())
+    new_months = [
+        month
+        for month in months(today - timedelta(days=days), today)
+        if partition_name(month) not in existing
+    ]
+    for query in create_partitions_queries(new_months, existing):
+        await connection.execute(text(query))
+
+    quiz_ids = list(range(quiz_id_start, quiz_id_start + quizzes))
+    copied = 0
+    for batch in generate_records(
+        records, user_ids, quiz_ids, quiz_skew, user_alpha, days, rng
+    ):
+        await raw_connection.copy_records_to_table(
+            Record.__tablename__,
+            records=batch,
+            columns=["user_id", "quiz_id", "quiz_name", "score", "created_at"],
+        )
+        copied += len(batch)
+        if progress is not None:
+            progress(copied)
+    return user_ids
@@ -0,0 +1,34 @@
+import logging
+import os
+
+import uvicorn
+
+from app.config import get_response_cache_options, get_server_options
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    options = get_server_options()
+    if options["workers"] > 1 and get_response_cache_options()["backend"] == "memory":
+        # Tag versions of the memory cache live in each process, so a write on one
+        # worker would leave the others serving stale pages and 304s.
+        logger.warning(
+            "Response cache disabled: the memory backend needs WEB_WORKERS=1, "
+            "use RESPONSE_CACHE_BACKEND=redis with several workers"
+        )
+        os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+    # Every worker is a separate process that imports the app and opens its
+    # own database pool and HTTP clients in the lifespan hook.
+    uvicorn.run(
+        "app.main:app",
+        host=options["host"],
+        port=options["port"],
+        workers=options["workers"],
+        lifespan="on",
+        timeout_graceful_shutdown=options["graceful_timeout"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import asyncio
+
+from fastapi import APIRouter, Request, status
+from fastapi.responses import ORJSONResponse
+
+from app.config import get_server_options
+from app.database import get_pool_status, ping_database
+
+router = APIRouter(prefix="/service", tags=["Служебное"])
+
+
+@router.get("/pool", summary="Получить состояние пула соединений с БД")
+async def get_pool():
+    return get_pool_status()
+
+
+@router.get("/ready", summary="Проверить готовность процесса принимать запросы")
+async def get_ready(request: Request):
+    pool = get_pool_status()
+    problem = None
+    if not getattr(request.app.state, "ready", False):
+        problem = "Процесс запускается или останавливается"
+    elif pool["checked_out"] >= pool["size"] + pool["max_overflow"]:
+        problem = "Все соединения с БД заняты"
+    else:
+        try:
+            await asyncio.wait_for(
+                ping_database(), get_server_options()["ready_timeout"]
+            )
+        except Exception:
+            problem = "БД недоступна"
+
+    if problem is not None:
+        return ORJSONResponse(
+            {"status": "unavailable", "detail": problem, "pool": pool},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return {"status": "ready", "pool": pool}
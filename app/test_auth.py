@@ -0,0 +1,41 @@
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.users.auth import PasswordHasher, authenticate_user, get_pwd_context
+from app.users.dao import UsersDAO
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_in_executor():
+    hasher = PasswordHasher()
+    hashed = await hasher.hash("12s34f5g6")
+    assert await hasher.verify_and_update("12s34f5g6", hashed) == (True, None)
+    assert (await hasher.verify_and_update("wrong", hashed))[0] is False
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher()
+    hasher.max_pending = 0
+    with pytest.raises(HTTPException) as error:
+        await hasher.hash("12s34f5g6")
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(hasher.retry_after)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_rehashes_on_cost_change(session):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("12s34f5g6")
+    user_id = await UsersDAO.register(
+        {"username": "Rehash", "email": "rehash@test.com", "password": old_hash},
+        session,
+    )
+
+    assert await authenticate_user("rehash@test.com", "12s34f5g6", session)
+    user = await UsersDAO.get_user_by_id(user_id, session)
+    assert user.password != old_hash
+    assert not get_pwd_context().needs_update(user.password)
+    assert get_pwd_context().verify("12s34f5g6", user.password)
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.users.dao import RecordsDAO, UsersDAO
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def explain(query, session) -> list[dict]:
+    # With sorting disabled the planner sorts only when no index provides the
+    # order, and otherwise may scan another index in order and filter rows.
+    await session.execute(text("SET LOCAL enable_sort = off"))
+    compiled = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+    return list(plan_nodes(result.scalar()[0]["Plan"]))
+
+
+def assert_streams_by(nodes: list[dict], column: str):
+    assert "Sort" not in [node["Node Type"] for node in nodes]
+    scans = [node for node in nodes if "Index Name" in node]
+    assert scans
+    assert all(column in scan.get("Index Cond", "") for scan in scans)
+
+
+@pytest.mark.asyncio
+async def test_quiz_export_streams_from_index(session):
+    nodes = await explain(RecordsDAO.records_export_query(1001601), session)
+    assert_streams_by(nodes, "quiz_id")
+
+
+@pytest.mark.asyncio
+async def test_user_export_streams_from_index(session):
+    nodes = await explain(UsersDAO.user_records_export_query(1), session)
+    assert_streams_by(nodes, "user_id")
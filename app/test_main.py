@@ -1,15 +1,30 @@
+import csv
+import io
+import json
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from app.config import get_db_url
-from app.dependencies import get_session
-from app.main import app
+from app.config import get_db_url, get_rate_limit_options, get_settings
+from app.database import (
+    QueryBudgetExceeded,
+    get_replica_engines,
+    get_replica_sessionmakers,
+    query_tracker,
+)
+from app.dependencies import READ_PRIMARY_COOKIE, get_session, get_session_factory
+from app.main import app, lifespan
+from app.rate_limit import write_slots
+from app.response_cache import response_cache
+from app.users.auth import create_access_token
+from app.users.cache import get_user_cache
 
 
 @pytest.fixture
 async def test_client():
     engine_test = create_async_engine(get_db_url(), echo=True)
+    query_tracker.install(engine_test.sync_engine)
     async_session_test = async_sessionmaker(engine_test, expire_on_commit=False)
 
     async with engine_test.connect() as connection:
@@ -20,6 +35,9 @@ async def test_client():
             yield session
 
         app.dependency_overrides[get_session] = override_get_session
+        app.dependency_overrides[get_session_factory] = lambda: async_sessionmaker(
+            bind=connection, expire_on_commit=False
+        )
 
         transport = ASGITransport(app=app)
         async with AsyncClient(transport=transport, base_url="http://") as client:
@@ -70,6 +88,23 @@ async def test_register(test_client, user_payload):
     assert response.json() == {"message": "Вы успешно зарегистрированы!"}
 
 
+@pytest.mark.asyncio
+async def test_register_email_taken_in_any_case(test_client, user_payload):
+    response = await test_client.post("api/v1/users:register/", json=user_payload)
+    assert response.status_code == 200
+
+    payload = {**user_payload, "email": user_payload["email"].upper()}
+    response = await test_client.post("api/v1/users:register/", json=payload)
+    assert response.status_code == 409
+
+    response = await test_client.post(
+        "/api/v1/users:login/",
+        json={"email": payload["email"], "password": payload["password"]},
+    )
+    assert response.status_code == 200
+    assert response.json()["users_access_token"]
+
+
 @pytest.mark.asyncio
 async def test_register_invalid(test_client, user_payload_invalid):
     response = await test_client.post(
@@ -160,3 +195,491 @@ async def test_add_record_to_current_user(test_client, user_payload):
     )
     assert response.status_code == 200
     assert response.json()["data"]["score"] == 85
+
+
+@pytest.fixture()
+async def auth_headers(test_client, user_payload):
+    await test_client.post("/api/v1/users:register/", json=user_payload)
+    login_response = await test_client.post(
+        "/api/v1/users:login/",
+        json={"email": user_payload["email"], "password": user_payload["password"]},
+    )
+    access_token = login_response.json()["users_access_token"]
+    return {"Cookie": f"users_access_token={access_token}"}
+
+
+@pytest.mark.asyncio
+async def test_get_records_by_quiz_id_paginated(test_client, auth_headers):
+    quiz_id = 1000301
+    for score in [40, 90, 70, 90]:
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": quiz_id, "score": score},
+            headers=auth_headers,
+        )
+
+    scores, cursor = [], None
+    for _ in range(2):
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = await test_client.get(f"/api/v1/records/{quiz_id}", params=params)
+        assert response.status_code == 200
+        scores += [record["score"] for record in response.json()["data"]]
+        cursor = response.json()["next_cursor"]
+    assert scores == [90, 90, 70, 40]
+    assert cursor is None
+
+    response = await test_client.get(
+        f"/api/v1/records/{quiz_id}", params={"best_per_user": True}
+    )
+    assert [record["score"] for record in response.json()["data"]] == [90]
+
+
+@pytest.mark.asyncio
+async def test_get_records_by_quiz_id_invalid_cursor(test_client):
+    response = await test_client.get("/api/v1/records/1", params={"cursor": "abc"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_records_since_with_time_zone(test_client, auth_headers):
+    quiz_id = 1000501
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": quiz_id, "score": 5},
+        headers=auth_headers,
+    )
+    current_user = await test_client.get(
+        "/api/v1/users:current-user/", headers=auth_headers
+    )
+    user_id = current_user.json()["data"]["id"]
+
+    for path in [f"/api/v1/records/{quiz_id}", f"/api/v1/users/{user_id}/records"]:
+        for since, count in [
+            ("2020-01-01T00:00:00Z", 1),
+            ("2020-01-01T00:00:00+03:00", 1),
+            ("2100-01-01T00:00:00Z", 0),
+        ]:
+            response = await test_client.get(path, params={"since": since})
+            assert response.status_code == 200, path
+            assert len(response.json()["data"]) == count
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_records_paginated(test_client, auth_headers):
+    for score in range(5):
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": 1000401, "score": score},
+            headers=auth_headers,
+        )
+
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "before": cursor}
+        response = await test_client.get(
+            "/api/v1/users:current-user/records", params=params, headers=auth_headers
+        )
+        assert response.status_code == 200
+        ids += [record["id"] for record in response.json()["data"]]
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(ids) == 5
+    assert len(set(ids)) == 5
+
+
+@pytest.mark.asyncio
+async def test_user_records_cursor_with_time_zone(test_client, auth_headers):
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": 1000601, "score": 5},
+        headers=auth_headers,
+    )
+    current_user = await test_client.get(
+        "/api/v1/users:current-user/", headers=auth_headers
+    )
+    user_id = current_user.json()["data"]["id"]
+
+    for path in [
+        f"/api/v1/users/{user_id}/records",
+        "/api/v1/users:current-user/records",
+    ]:
+        for before, count in [
+            ("2100-01-01T00:00:00+03:00_0", 1),
+            ("2020-01-01T00:00:00Z_0", 0),
+        ]:
+            response = await test_client.get(
+                path, params={"before": before}, headers=auth_headers
+            )
+            assert response.status_code == 200, path
+            assert len(response.json()["data"]) == count
+
+
+@pytest.mark.asyncio
+async def test_current_user_from_verified_claims(test_client):
+    access_token = create_access_token(
+        {"sub": "999999999", "username": "Claims", "email": "claims@test.com"}
+    )
+    headers = {"Cookie": f"users_access_token={access_token}"}
+    response = await test_client.get("/api/v1/users:current-user/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"] == {
+        "id": 999999999,
+        "username": "Claims",
+        "email": "claims@test.com",
+    }
+
+
+@pytest.mark.asyncio
+async def test_current_user_without_claims_is_looked_up(test_client):
+    access_token = create_access_token({"sub": "999999999"})
+    headers = {"Cookie": f"users_access_token={access_token}"}
+    response = await test_client.get("/api/v1/users:current-user/", headers=headers)
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_current_user_without_claims_is_cached(test_client, auth_headers):
+    current_user = await test_client.get(
+        "/api/v1/users:current-user/", headers=auth_headers
+    )
+    user_id = current_user.json()["data"]["id"]
+    access_token = create_access_token({"sub": str(user_id)})
+    headers = {"Cookie": f"users_access_token={access_token}"}
+
+    user_cache = get_user_cache()
+    hits = user_cache.hits
+    for _ in range(2):
+        response = await test_client.get("/api/v1/users:current-user/", headers=headers)
+        assert response.json()["data"] == current_user.json()["data"]
+    assert user_cache.hits == hits + 1
+
+    user_cache.invalidate(user_id)
+    assert user_cache.get(user_id) is None
+
+
+@pytest.mark.asyncio
+async def test_pool_status(test_client):
+    response = await test_client.get("/service/pool")
+    assert response.status_code == 200
+    assert {"size", "checked_out", "overflow"} <= response.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_add_record_idempotency_key(test_client, auth_headers, monkeypatch):
+    quiz_name_fetches = []
+
+    async def set_quiz_name(record):
+        quiz_name_fetches.append(record["quiz_id"])
+        record["quiz_name"] = "Quiz"
+        return record
+
+    monkeypatch.setattr("app.users.router.set_quiz_name", set_quiz_name)
+    headers = {**auth_headers, "Idempotency-Key": "attempt-1"}
+    responses = [
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": 1001001, "score": 42},
+            headers=headers,
+        )
+        for _ in range(2)
+    ]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].json() == responses[1].json()
+    assert "Idempotent-Replayed" not in responses[0].headers
+    assert responses[1].headers["Idempotent-Replayed"] == "true"
+    assert quiz_name_fetches == [1001001]
+
+    response = await test_client.get(
+        "/api/v1/users:current-user/records", headers=auth_headers
+    )
+    assert [record["quiz_id"] for record in response.json()["data"]] == [1001001]
+
+
+@pytest.mark.asyncio
+async def test_add_records_batch(test_client, auth_headers):
+    records = [
+        {"quiz_id": 1000901, "score": 10},
+        {"quiz_id": 1000902, "score": 20},
+        {"quiz_id": 1000901, "score": 30},
+    ]
+    response = await test_client.post(
+        "/api/v1/users:current-user/records:batch",
+        json={"records": records},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [(r["quiz_id"], r["score"]) for r in data] == [
+        (r["quiz_id"], r["score"]) for r in records
+    ]
+    assert len({r["id"] for r in data}) == 3
+
+
+@pytest.mark.asyncio
+async def test_add_records_batch_empty(test_client, auth_headers):
+    response = await test_client.post(
+        "/api/v1/users:current-user/records:batch",
+        json={"records": []},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_quiz_stats(test_client, auth_headers):
+    quiz_id = 1001104
+    response = await test_client.get(f"/api/v1/records/{quiz_id}/stats")
+    assert response.json()["data"]["attempts"] == 0
+
+    for score in [20, 40]:
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": quiz_id, "score": score},
+            headers=auth_headers,
+        )
+    response = await test_client.get(f"/api/v1/records/{quiz_id}/stats")
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["attempts"], data["average_score"], data["best_score"]) == (2, 30, 40)
+    assert data["histogram"][20] == data["histogram"][40] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_quiz_rank(test_client, auth_headers):
+    quiz_id = 1001201
+    for score in [10, 50, 50, 90]:
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": quiz_id, "score": score},
+            headers=auth_headers,
+        )
+
+    response = await test_client.get(
+        f"/api/v1/records/{quiz_id}/rank", params={"score": 50}
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["rank"], data["attempts"], data["percentile"]) == (2, 4, 25)
+
+    current_user = await test_client.get(
+        "/api/v1/users:current-user/", headers=auth_headers
+    )
+    user_id = current_user.json()["data"]["id"]
+    response = await test_client.get(f"/api/v1/users/{user_id}/records/{quiz_id}/rank")
+    data = response.json()["data"]
+    assert (data["score"], data["rank"], data["percentile"]) == (90, 1, 75)
+
+    response = await test_client.get(f"/api/v1/users/{user_id}/records/1/rank")
+    assert response.json()["errors"][0]["code"] == "NotFoundHttpException"
+
+
+@pytest.mark.asyncio
+async def test_cached_response_etag(test_client, auth_headers):
+    quiz_id = 1001301
+    response = await test_client.get(f"/api/v1/records/{quiz_id}/stats")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = await test_client.get(
+        f"/api/v1/records/{quiz_id}/stats", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": quiz_id, "score": 70},
+        headers=auth_headers,
+    )
+    response = await test_client.get(
+        f"/api/v1/records/{quiz_id}/stats", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["data"]["attempts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_export_quiz_records(test_client, auth_headers):
+    quiz_id = 1001401
+    await test_client.post(
+        "/api/v1/users:current-user/records:batch",
+        json={"records": [{"quiz_id": quiz_id, "score": score} for score in [5, 6]]},
+        headers=auth_headers,
+    )
+
+    response = await test_client.get(f"/api/v1/records/{quiz_id}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["score"] for line in lines] == [6, 5]
+
+    response = await test_client.get(
+        f"/api/v1/records/{quiz_id}/export", params={"format": "csv"}
+    )
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "user_id", "quiz_id", "quiz_name", "score", "created_at"]
+    assert [row[4] for row in rows[1:]] == ["6", "5"]
+
+
+@pytest.mark.asyncio
+async def test_export_user_records(test_client, auth_headers):
+    user = await test_client.get("/api/v1/users:current-user/", headers=auth_headers)
+    user_id = user.json()["data"]["id"]
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": 1001402, "score": 7},
+        headers=auth_headers,
+    )
+
+    response = await test_client.get(f"/api/v1/users/{user_id}/records/export")
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(line["user_id"], line["score"]) for line in lines] == [(user_id, 7)]
+
+
+@pytest.mark.asyncio
+async def test_metrics(test_client, auth_headers):
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": 1001501, "score": 1},
+        headers=auth_headers,
+    )
+    response = await test_client.get("/metrics")
+    assert response.status_code == 200
+    metrics = response.text
+    assert (
+        'http_requests_total{method="POST",route="/api/v1/users:current-user/records",'
+        'status="200"}' in metrics
+    )
+    assert 'http_request_duration_seconds_bucket{method="POST",route=' in metrics
+    assert 'http_requests_in_flight{method="GET"} 1' in metrics
+    assert 'span_duration_seconds_count{span="jwt_decode"}' in metrics
+    assert 'span_duration_seconds_count{span="records_commit"}' in metrics
+    assert 'db_pool_connections{state="size"}' in metrics
+    assert "password_hash_pending 0" in metrics
+    assert 'user_cache_lookups_total{result="miss"}' in metrics
+    assert "user_cache_max_entries" in metrics
+    assert 'quiz_name_cache_lookups_total{result="miss"}' in metrics
+
+
+@pytest.mark.asyncio
+async def test_query_budget_exceeded(test_client, auth_headers, monkeypatch):
+    monkeypatch.setattr(query_tracker, "budget", 1)
+    with pytest.raises(QueryBudgetExceeded, match=":current-user/records"):
+        await test_client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": 1001601, "score": 1},
+            headers=auth_headers,
+        )
+
+
+@pytest.mark.asyncio
+async def test_slow_query_is_logged(test_client, monkeypatch, caplog):
+    monkeypatch.setattr(query_tracker, "slow_query_threshold", 0)
+    response = await test_client.get("/api/v1/records/1001602/stats")
+    assert response.status_code == 200
+    assert "Slow query" in caplog.text
+    assert "/api/v1/records/{quiz_id}/stats" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_by_ip(test_client):
+    payload = {"email": "nobody@test.com", "password": "12s34f5g6"}
+    for _ in range(get_rate_limit_options()["auth_burst"]):
+        response = await test_client.post("/api/v1/users:login/", json=payload)
+        assert response.status_code == 401
+
+    response = await test_client.post("/api/v1/users:login/", json=payload)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.fixture
+async def replica(monkeypatch):
+    # The same database, seen outside the uncommitted test transaction.
+    monkeypatch.setattr(get_settings(), "DB_REPLICA_URLS", get_db_url())
+    get_replica_engines.cache_clear()
+    get_replica_sessionmakers.cache_clear()
+    yield
+    for engine in get_replica_engines():
+        await engine.dispose()
+    get_replica_engines.cache_clear()
+    get_replica_sessionmakers.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_except_own_writes(
+    test_client, auth_headers, replica
+):
+    response = await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": 1002101, "score": 5},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert response.cookies[READ_PRIMARY_COOKIE] == "1"
+    cookie = response.headers["set-cookie"].lower()
+    assert "samesite=none" in cookie and "secure" in cookie
+
+    response = await test_client.get(
+        "/api/v1/users:current-user/records", headers=auth_headers
+    )
+    assert response.json()["data"] == []
+
+    headers = {"Cookie": f"{auth_headers['Cookie']}; {READ_PRIMARY_COOKIE}=1"}
+    response = await test_client.get(
+        "/api/v1/users:current-user/records", headers=headers
+    )
+    assert [record["quiz_id"] for record in response.json()["data"]] == [1002101]
+
+
+@pytest.mark.asyncio
+async def test_cached_pages_are_filled_from_primary(
+    test_client, auth_headers, replica, monkeypatch
+):
+    quiz_id = 1002301
+    await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": quiz_id, "score": 5},
+        headers=auth_headers,
+    )
+
+    # The replica does not see the record yet, so the page is rendered from the
+    # primary instead of being cached empty under the bumped version.
+    response = await test_client.get(f"/api/v1/records/{quiz_id}")
+    assert [record["quiz_id"] for record in response.json()["data"]] == [quiz_id]
+
+    monkeypatch.setattr(response_cache, "backend", None)
+    response = await test_client.get(f"/api/v1/records/{quiz_id}")
+    assert response.json()["data"] == []
+
+
+@pytest.mark.asyncio
+async def test_record_writes_shed_when_saturated(
+    test_client, auth_headers, monkeypatch
+):
+    monkeypatch.setattr(write_slots, "limit", 0)
+    response = await test_client.post(
+        "/api/v1/users:current-user/records",
+        json={"quiz_id": 1002001, "score": 1},
+        headers=auth_headers,
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(write_slots.retry_after)
+
+
+@pytest.mark.asyncio
+async def test_ready_follows_lifespan(test_client):
+    response = await test_client.get("/service/ready")
+    assert response.status_code == 503
+
+    async with lifespan(app):
+        response = await test_client.get("/service/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+    response = await test_client.get("/service/ready")
+    assert response.status_code == 503
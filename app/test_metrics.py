@@ -0,0 +1,56 @@
+from app.cache import TTLCache
+from app.metrics import Counter, Gauge, Histogram, Registry, cache_metrics
+
+
+def test_registry_renders_prometheus_text(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr("app.metrics.registry", registry)
+
+    requests = Counter("test_requests_total", "Requests", ["route"])
+    requests.inc("/a")
+    requests.inc("/a")
+    Gauge("test_queue", "Queue depth", collect=lambda: {(): 3})
+    latency = Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/a"} 2',
+        "# HELP test_queue Queue depth",
+        "# TYPE test_queue gauge",
+        "test_queue 3",
+        "# HELP test_latency_seconds Latency",
+        "# TYPE test_latency_seconds histogram",
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="1.0"} 2',
+        'test_latency_seconds_bucket{le="+Inf"} 3',
+        "test_latency_seconds_sum 5.55",
+        "test_latency_seconds_count 3",
+    ]
+
+
+def test_cache_metrics(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr("app.metrics.registry", registry)
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache_metrics("test_cache", "Test cache", lambda: cache)
+
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    assert registry.render().splitlines() == [
+        "# HELP test_cache_lookups_total Test cache lookups by result",
+        "# TYPE test_cache_lookups_total counter",
+        'test_cache_lookups_total{result="hit"} 1',
+        'test_cache_lookups_total{result="miss"} 1',
+        "# HELP test_cache_entries Test cache entries",
+        "# TYPE test_cache_entries gauge",
+        "test_cache_entries 1",
+        "# HELP test_cache_max_entries Test cache capacity",
+        "# TYPE test_cache_max_entries gauge",
+        "test_cache_max_entries 10",
+    ]
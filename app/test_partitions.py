@@ -0,0 +1,97 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.users.dao import PartitionsDAO, RecordsDAO, UsersDAO
+from app.users.partitions import add_months, month_start, partition_month
+
+
+def test_month_arithmetic():
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert month_start(datetime(2026, 10, 18, 12)) == date(2026, 10, 1)
+    assert partition_month("records_2026_10") == date(2026, 10, 1)
+    assert partition_month("records_default") is None
+
+
+@pytest.mark.asyncio
+async def test_create_and_detach_partitions(session):
+    created = await PartitionsDAO.create_partitions(
+        date(2019, 11, 1), date(2020, 1, 1), session
+    )
+    assert created == ["records_2019_11", "records_2019_12", "records_2020_01"]
+    assert (
+        await PartitionsDAO.create_partitions(
+            date(2019, 11, 1), date(2020, 1, 1), session
+        )
+        == []
+    )
+
+    detached = await PartitionsDAO.detach_partitions(
+        date(2020, 1, 1), session, drop=True
+    )
+    assert detached == ["records_2019_11", "records_2019_12"]
+    assert "records_2020_01" in await PartitionsDAO.get_partitions(session)
+    assert "records_2019_12" not in await PartitionsDAO.get_partitions(session)
+
+
+@pytest.mark.asyncio
+async def test_create_partition_moves_rows_out_of_default(session):
+    user_id = await UsersDAO.register(
+        {"username": "Default", "email": "default@test.com", "password": "-"},
+        session,
+    )
+    await session.execute(
+        text(
+            "INSERT INTO records (user_id, quiz_id, score, created_at) "
+            "VALUES (:user_id, 1002201, 1, '2019-10-15'), "
+            "(:user_id, 1002201, 2, '2019-09-15')"
+        ),
+        {"user_id": user_id},
+    )
+    await session.commit()
+
+    created = await PartitionsDAO.create_partitions(
+        date(2019, 10, 1), date(2019, 10, 1), session
+    )
+    assert created == ["records_2019_10"]
+
+    async def scores(table):
+        result = await session.execute(
+            text(f"SELECT score FROM {table} WHERE quiz_id = 1002201")
+        )
+        return result.scalars().all()
+
+    assert await scores("records_2019_10") == [1]
+    assert await scores("records_default") == [2]
+    assert "records_default" in await PartitionsDAO.get_partitions(session)
+
+
+@pytest.mark.asyncio
+async def test_records_queries_prune_partitions(session):
+    await PartitionsDAO.create_partitions(date(2019, 11, 1), date(2019, 12, 1), session)
+    user_id = await UsersDAO.register(
+        {"username": "Partitions", "email": "partitions@test.com", "password": "-"},
+        session,
+    )
+    user = await UsersDAO.get_user_by_id(user_id, session)
+    record = await RecordsDAO.add(user, {"quiz_id": 1001901, "score": 5}, session)
+
+    since = datetime(2019, 12, 15)
+    records = await RecordsDAO.get_records_by_id(1001901, session, since=since)
+    assert [row.id for row in records] == [record.id]
+    assert (
+        await RecordsDAO.get_records_by_id(1001901, session, since=datetime(2100, 1, 1))
+        == []
+    )
+
+    plan = await session.execute(
+        text(
+            "EXPLAIN SELECT id FROM records "
+            "WHERE quiz_id = 1001901 AND created_at >= '2019-12-15'"
+        )
+    )
+    plan = "\n".join(plan.scalars())
+    assert "records_2019_11" not in plan
+    assert "records_2019_12" in plan
@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.cache import TTLCache
+from app.quiz_backend import QuizBackendClient
+
+
+@pytest.fixture
+async def quiz_client():
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        await asyncio.sleep(0.01)
+        quiz_id = request.url.path.rsplit("/", 1)[-1]
+        if quiz_id == "404":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"name": f"Quiz {quiz_id}"})
+
+    client = QuizBackendClient()
+    client.start(transport=httpx.MockTransport(handler))
+    client.calls = calls
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_quiz_name_is_cached(quiz_client):
+    assert await quiz_client.get_quiz_name(1) == "Quiz 1"
+    assert await quiz_client.get_quiz_name(1) == "Quiz 1"
+    assert quiz_client.calls == ["/api/v1/quizzes/1"]
+    assert quiz_client.names.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_collapsed(quiz_client):
+    names = await asyncio.gather(*(quiz_client.get_quiz_name(7) for _ in range(10)))
+    assert names == ["Quiz 7"] * 10
+    assert quiz_client.calls == ["/api/v1/quizzes/7"]
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_not_cached(quiz_client):
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await quiz_client.get_quiz_name(404)
+    assert len(quiz_client.calls) == 2
+    assert len(quiz_client.names) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set(1, "a")
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_peek_is_not_counted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.peek(1) == "a"
+    assert cache.peek(3) is None
+    assert (cache.hits, cache.misses) == (0, 0)
+    # Peeking does not protect 1 from eviction.
+    cache.set(3, "c")
+    assert cache.peek(1) is None
@@ -0,0 +1,70 @@
+import pytest
+from fastapi import Request
+
+from app.config import get_settings
+from app.rate_limit import MemoryBackend, RedisBackend, get_client_ip
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_token_bucket():
+    backend = MemoryBackend(max_keys=2)
+    assert await backend.take("a", rate=1 / 60, burst=2) == 0
+    assert await backend.take("a", rate=1 / 60, burst=2) == 0
+    wait = await backend.take("a", rate=1 / 60, burst=2)
+    assert 59 < wait <= 60
+
+    assert await backend.take("b", rate=1 / 60, burst=1) == 0
+    assert await backend.take("c", rate=1 / 60, burst=1) == 0
+    # "a" is the least recently used key and is evicted with its empty bucket.
+    assert list(backend.buckets) == ["b", "c"]
+    assert await backend.take("a", rate=1 / 60, burst=2) == 0
+
+
+class FakeRedis:
+    def __init__(self, wait):
+        self.wait = wait
+        self.calls = []
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append((numkeys, *args))
+        return self.wait
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_runs_script():
+    client = FakeRedis(b"1.5")
+    backend = RedisBackend(client)
+    assert await backend.take("auth:127.0.0.1", rate=0.5, burst=10) == 1.5
+    assert client.calls == [(1, "rate-limit:auth:127.0.0.1", 0.5, 10)]
+
+
+def forwarded_request(forwarded: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [(b"x-forwarded-for", forwarded.encode())],
+            "client": ("10.0.0.2", 443),
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "hops, forwarded, client_ip",
+    [
+        (1, "203.0.113.7", "203.0.113.7"),
+        # The spoofed leftmost entry is ignored.
+        (1, "1.2.3.4, 203.0.113.7", "203.0.113.7"),
+        (2, "1.2.3.4, 203.0.113.7, 10.0.0.1", "203.0.113.7"),
+        (2, "203.0.113.7", "203.0.113.7"),
+    ],
+)
+def test_client_ip_counts_trusted_hops_from_right(
+    monkeypatch, hops, forwarded, client_ip
+):
+    monkeypatch.setattr(get_settings(), "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(get_settings(), "RATE_LIMIT_TRUSTED_HOPS", hops)
+    assert get_client_ip(forwarded_request(forwarded)) == client_ip
+
+
+def test_client_ip_ignores_forwarded_by_default():
+    assert get_client_ip(forwarded_request("1.2.3.4")) == "10.0.0.2"
@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import select
+
+from app.response_cache import MemoryBackend, response_cache
+from app.users.dao import UsersDAO, RecordsDAO
+from app.users.models import Record
+from app.users.resolver import QuizNameResolver
+
+
+class StubQuizBackend:
+    def __init__(self, names):
+        self.names = names
+        self.calls = []
+
+    async def get_quiz_name(self, quiz_id):
+        self.calls.append(quiz_id)
+        if quiz_id not in self.names:
+            raise LookupError(quiz_id)
+        return self.names[quiz_id]
+
+
+@pytest.fixture
+async def user(session_factory):
+    async with session_factory() as session:
+        user_id = await UsersDAO.register(
+            {"username": "Resolver", "email": "resolver@test.com", "password": "-"},
+            session,
+        )
+        return await UsersDAO.get_user_by_id(user_id, session)
+
+
+async def get_quiz_names(session_factory, user):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Record.quiz_id, Record.quiz_name)
+            .filter_by(user_id=user.id)
+            .order_by(Record.id)
+        )
+        return result.all()
+
+
+@pytest.mark.asyncio
+async def test_resolve_updates_unnamed_records(session_factory, user):
+    async with session_factory() as session:
+        for quiz_id, quiz_name in [(1, None), (1, ""), (2, None), (3, "Kept")]:
+            await RecordsDAO.add(
+                user, {"quiz_id": quiz_id, "score": 1, "quiz_name": quiz_name}, session
+            )
+
+    backend = StubQuizBackend({1: "First", 3: "Third"})
+    resolver = QuizNameResolver(session_factory=session_factory, backend=backend)
+    assert await resolver.resolve([1, 1, 2, 3]) == {1: "First", 3: "Third"}
+    assert sorted(backend.calls) == [1, 2, 3]
+
+    assert await get_quiz_names(session_factory, user) == [
+        (1, "First"),
+        (1, "First"),
+        (2, None),
+        (3, "Kept"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sweep_repairs_records_left_empty(session_factory, user):
+    async with session_factory() as session:
+        await RecordsDAO.add(
+            user, {"quiz_id": 987654, "score": 1, "quiz_name": ""}, session
+        )
+
+    backend = StubQuizBackend({987654: "Repaired"})
+    resolver = QuizNameResolver(session_factory=session_factory, backend=backend)
+    resolver.batch_size = 1000
+    quiz_names = await resolver.sweep()
+
+    assert quiz_names[987654] == "Repaired"
+    assert await get_quiz_names(session_factory, user) == [(987654, "Repaired")]
+
+
+@pytest.mark.asyncio
+async def test_sweep_moves_past_unresolvable_quiz_ids(session_factory, user):
+    async with session_factory() as session:
+        for quiz_id in [990001, 990002, 990003]:
+            await RecordsDAO.add(
+                user, {"quiz_id": quiz_id, "score": 1, "quiz_name": None}, session
+            )
+
+    backend = StubQuizBackend({990003: "Reached"})
+    resolver = QuizNameResolver(session_factory=session_factory, backend=backend)
+    resolver.batch_size = 1
+    resolver.workers = 1
+    resolver.sweep_after = 990000
+
+    assert await resolver.sweep() == {}
+    assert await resolver.sweep() == {}
+    assert await resolver.sweep() == {990003: "Reached"}
+    assert backend.calls == [990001, 990002, 990003]
+
+    # Nothing left after 990003, so the next sweep wraps around to the start.
+    await resolver.sweep()
+    assert resolver.sweep_after is None
+
+
+@pytest.mark.asyncio
+async def test_resolve_invalidates_only_updated_users(
+    session_factory, user, monkeypatch
+):
+    backend = MemoryBackend(maxsize=10, ttl=30)
+    monkeypatch.setattr(response_cache, "backend", backend)
+    async with session_factory() as session:
+        await RecordsDAO.add(
+            user, {"quiz_id": 990101, "score": 1, "quiz_name": None}, session
+        )
+    tags = [f"user:{user.id}", f"user:{user.id + 1}", "quiz:990101"]
+    before = await backend.get_versions(tags)
+
+    resolver = QuizNameResolver(
+        session_factory=session_factory, backend=StubQuizBackend({990101: "Named"})
+    )
+    await resolver.resolve([990101])
+
+    after = await backend.get_versions(tags)
+    assert [new > old for old, new in zip(before, after)] == [True, False, True]
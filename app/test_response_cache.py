@@ -0,0 +1,92 @@
+import pytest
+from fastapi import Request
+from fastapi.responses import ORJSONResponse
+
+from app.response_cache import MemoryBackend, RedisBackend, ResponseCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+
+def make_request(path, headers=()):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [(name.encode(), value.encode()) for name, value in headers],
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_versions():
+    client = FakeRedis()
+    calls = []
+
+    async def build():
+        calls.append(1)
+        return ORJSONResponse({"data": len(calls)})
+
+    first = ResponseCache(RedisBackend(client, ttl=30))
+    second = ResponseCache(RedisBackend(client, ttl=30))
+    response = await first.respond(make_request("/quiz"), ["quiz:1"], build)
+    assert response.body == b'{"data":1}'
+    response = await second.respond(make_request("/quiz"), ["quiz:1"], build)
+    assert response.body == b'{"data":1}'
+    assert len(calls) == 1
+
+    etag = response.headers["ETag"]
+    response = await second.respond(
+        make_request("/quiz", [("if-none-match", etag)]), ["quiz:1"], build
+    )
+    assert response.status_code == 304
+
+    await first.invalidate("quiz:1")
+    response = await second.respond(make_request("/quiz"), ["quiz:1"], build)
+    assert response.body == b'{"data":2}'
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached():
+    cache = ResponseCache(RedisBackend(FakeRedis(), ttl=30))
+
+    async def build():
+        return ORJSONResponse({"errors": []}, status_code=500)
+
+    response = await cache.respond(make_request("/quiz"), ["quiz:1"], build)
+    assert response.status_code == 500
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicted_tags_never_reuse_versions():
+    backend = MemoryBackend(maxsize=10, ttl=30, max_tags=2)
+    await backend.bump(["user:1"])
+    await backend.bump(["user:1"])
+    stale = await backend.get_versions(["user:1"])
+    assert stale == [2]
+
+    await backend.bump(["user:2"])
+    await backend.bump(["user:3"])
+    # user:1 is the least recently used tag and is evicted.
+    assert list(backend.versions) == ["user:2", "user:3"]
+    assert await backend.get_versions(["user:1"]) != stale
+    await backend.bump(["user:1"])
+    assert (await backend.get_versions(["user:1"]))[0] > stale[0]
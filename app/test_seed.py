@@ -0,0 +1,46 @@
+import random
+from collections import Counter
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import get_db_url
+from app.seed import SEED_EMAIL_DOMAIN, generate_records, seed_database
+from app.users.models import Record, User
+
+
+def test_generate_records_is_skewed():
+    rng = random.Random(1)
+    batches = list(
+        generate_records(20000, list(range(100)), list(range(50)), 1.1, 1.2, 30, rng)
+    )
+    rows = [row for batch in batches for row in batch]
+    assert len(rows) == 20000
+
+    quizzes = Counter(row[1] for row in rows)
+    users = Counter(row[0] for row in rows)
+    assert quizzes.most_common(1)[0][1] > 5 * 20000 / 50
+    assert sum(count for _, count in users.most_common(10)) > 0.2 * 20000
+    assert all(0 <= row[3] <= 99 for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_seed_database_copies_rows():
+    engine = create_async_engine(get_db_url())
+    async with engine.connect() as connection:
+        trans = await connection.begin()
+        user_ids = await seed_database(
+            connection, users=20, records=500, quizzes=5, quiz_id_start=1001801
+        )
+
+        users = await connection.execute(
+            select(func.count()).where(User.email.like(f"%@{SEED_EMAIL_DOMAIN}"))
+        )
+        records = await connection.execute(
+            select(func.count()).where(Record.user_id.in_(user_ids))
+        )
+        assert users.scalar_one() == 20
+        assert records.scalar_one() == 500
+        await trans.rollback()
+    await engine.dispose()
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from app import server
+from app.config import get_settings
+
+
+@pytest.mark.parametrize(
+    "workers, backend, expected",
+    [(4, "memory", "none"), (1, "memory", "memory"), (4, "redis", "redis")],
+)
+def test_memory_response_cache_needs_one_worker(
+    monkeypatch, workers, backend, expected
+):
+    monkeypatch.setattr(get_settings(), "WEB_WORKERS", workers)
+    monkeypatch.setattr(get_settings(), "RESPONSE_CACHE_BACKEND", backend)
+    monkeypatch.setenv("RESPONSE_CACHE_BACKEND", backend)
+    runs = []
+    monkeypatch.setattr(
+        server.uvicorn, "run", lambda *args, **kwargs: runs.append(kwargs)
+    )
+
+    server.main()
+
+    assert runs[0]["workers"] == workers
+    # Workers are new processes that read the setting from the environment.
+    assert os.environ["RESPONSE_CACHE_BACKEND"] == expected
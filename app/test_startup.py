@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+# Cumulative `python -X importtime` of app.main, generous enough for slow CI.
+IMPORT_TIME_BUDGET = 3.0
+# Loaded on first use (first request, login or lifespan), never at import.
+LAZY_MODULES = ["passlib", "bcrypt", "jose", "httpx", "asyncpg", "redis"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app(env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys, app.main; print(' '.join(sorted(sys.modules)))",
+        ],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_import_does_not_need_settings():
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if not name.startswith(("DB_", "QUIZM_"))
+        and name not in ("SECRET_KEY", "ALGORITHM")
+    }
+    result = import_app(env)
+    assert result.returncode == 0, result.stderr
+
+
+def test_import_time_budget():
+    result = import_app(dict(os.environ))
+    assert result.returncode == 0, result.stderr
+
+    modules = set(result.stdout.split())
+    assert [name for name in LAZY_MODULES if name in modules] == []
+
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[2].strip() == "app.main"
+    )
+    assert cumulative / 1e6 < IMPORT_TIME_BUDGET
@@ -0,0 +1,60 @@
+import pytest
+
+from app.users.dao import UsersDAO, RecordsDAO, QuizStatsDAO
+from app.users.models import SCORE_BUCKETS
+
+
+@pytest.fixture
+async def user(session):
+    user_id = await UsersDAO.register(
+        {"username": "Stats", "email": "stats@test.com", "password": "-"}, session
+    )
+    return await UsersDAO.get_user_by_id(user_id, session)
+
+
+def as_tuple(stats):
+    return stats.attempts, stats.score_sum, stats.best_score, list(stats.histogram)
+
+
+@pytest.mark.asyncio
+async def test_stats_are_maintained_on_insert(session, user):
+    quiz_id = 1001101
+    await RecordsDAO.add(user, {"quiz_id": quiz_id, "score": 50}, session)
+    await RecordsDAO.add_many(
+        user,
+        [{"quiz_id": quiz_id, "score": score} for score in [0, 99, 50]],
+        session,
+    )
+
+    stats = await QuizStatsDAO.get_stats(quiz_id, session)
+    expected_histogram = [0] * SCORE_BUCKETS
+    expected_histogram[0] = 1
+    expected_histogram[50] = 2
+    expected_histogram[99] = 1
+    assert as_tuple(stats) == (4, 199, 99, expected_histogram)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental_stats(session, user):
+    quiz_ids = [1001102, 1001103]
+    await RecordsDAO.add_many(
+        user,
+        [
+            {"quiz_id": quiz_id, "score": score}
+            for quiz_id in quiz_ids
+            for score in [7, 7, 80]
+        ],
+        session,
+    )
+    incremental = [as_tuple(await QuizStatsDAO.get_stats(q, session)) for q in quiz_ids]
+
+    await QuizStatsDAO.rebuild(session)
+    session.expire_all()
+    rebuilt = [as_tuple(await QuizStatsDAO.get_stats(q, session)) for q in quiz_ids]
+    assert rebuilt == incremental
+
+    await QuizStatsDAO.rebuild(session, quiz_id=quiz_ids[0])
+    session.expire_all()
+    assert (
+        as_tuple(await QuizStatsDAO.get_stats(quiz_ids[0], session)) == incremental[0]
+    )
@@ -1,27 +1,114 @@
-from fastapi import Depends
-from passlib.context import CryptContext
-from jose import jwt
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
 from datetime import datetime, timedelta, timezone
 
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import get_auth_data
+from app.config import get_auth_data, get_password_hash_options, lazy_option
 from app.dependencies import get_session
+from app.metrics import Gauge
 from app.users.dao import UsersDAO
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache
+def get_pwd_context():
+    # passlib and bcrypt are only loaded once a password is hashed or checked.
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=get_password_hash_options()["rounds"],
+    )
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    executor_type = lazy_option(get_password_hash_options, "executor")
+    workers = lazy_option(get_password_hash_options, "workers")
+    max_pending = lazy_option(get_password_hash_options, "max_pending")
+    retry_after = lazy_option(get_password_hash_options, "retry_after")
+
+    def __init__(self):
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        # Fail fast instead of queueing behind a login spike.
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, Optional[str]]:
+        return await self.run(
+            verify_and_update_password, plain_password, hashed_password
+        )
+
+
+password_hasher = PasswordHasher()
+
+Gauge(
+    "password_hash_pending",
+    "bcrypt operations queued or running in the executor",
+    collect=lambda: {(): password_hasher.pending},
+)
 
 
 def create_access_token(data: dict) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(days=30)
     to_encode.update({"exp": expire})
@@ -33,11 +120,18 @@ def create_access_token(data: dict) -> str:
 
 
 async def authenticate_user(email: EmailStr, password: str, session: AsyncSession):
-    user = await UsersDAO.get_user_by_email(email, session)
-    if (
-        not user
-        or verify_password(plain_password=password, hashed_password=user.password)
-        is False
-    ):
+    # Only the columns needed for the token, not a full User entity.
+    user = await UsersDAO.get_credentials_by_email(email, session)
+    if not user:
         return None
+
+    verified, new_hash = await password_hasher.verify_and_update(
+        plain_password=password, hashed_password=user.password
+    )
+    if not verified:
+        return None
+
+    # The hash was made with a different BCRYPT_ROUNDS, store it with the new cost.
+    if new_hash is not None:
+        await UsersDAO.update(user.id, {"password": new_hash}, session)
     return user
@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from app.cache import TTLCache
+from app.config import get_user_cache_options
+from app.metrics import cache_metrics
+
+
+# UserPrincipal snapshots keyed by user id, used when the token has no claims.
+@lru_cache
+def get_user_cache() -> TTLCache:
+    return TTLCache(**get_user_cache_options())
+
+
+cache_metrics("user_cache", "User cache", get_user_cache)
@@ -1,29 +1,90 @@
+from collections import Counter
+from datetime import date, datetime
+from typing import Iterable, Optional
+
 from fastapi import Depends
+
+from sqlalchemy import and_, case, delete, func, insert, or_, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlalchemy.future import select
-from app.users.models import User, Record
+from sqlalchemy.orm import aliased
+from app.metrics import span
+from app.response_cache import response_cache
+from app.users.cache import get_user_cache
+from app.users.models import (
+    User,
+    Record,
+    RecordIdempotencyKey,
+    QuizStats,
+    SCORE_BUCKETS,
+    naive_utc,
+)
+from app.users.partitions import (
+    PARENT_TABLE,
+    create_partitions_queries,
+    list_partitions_query,
+    months,
+    partition_month,
+    partition_name,
+)
 from ..database import async_session
 
 
+def record_columns(records=Record):
+    return (
+        records.id,
+        records.user_id,
+        records.quiz_id,
+        records.quiz_name,
+        records.score,
+        records.created_at,
+    )
+
+
 class UsersDAO:
     @classmethod
-    async def add(cls, user_dict, session: AsyncSession):
-        new_instance = User(**user_dict)
-        session.add(new_instance)
+    async def update(cls, id: int, values: dict, session: AsyncSession):
+        query = update(User).filter_by(id=id).values(**values)
         try:
+            await session.execute(query)
             await session.commit()
         except SQLAlchemyError as e:
             await session.rollback()
             raise e
-        return new_instance
+        get_user_cache().invalidate(id)
+        await response_cache.invalidate(f"user:{id}")
 
     @classmethod
-    async def get_user_by_email(cls, email: str, session: AsyncSession):
-        query = select(User).filter_by(email=email)
+    async def register(cls, user_dict, session: AsyncSession) -> Optional[int]:
+        # Returns None when the email is taken, without a separate lookup.
+        query = (
+            pg_insert(User)
+            .values(**user_dict)
+            .on_conflict_do_nothing(index_elements=[func.lower(User.email)])
+            .returning(User.id)
+        )
+        try:
+            result = await session.execute(query)
+            user_id = result.scalar_one_or_none()
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        if user_id is not None:
+            get_user_cache().invalidate(user_id)
+            await response_cache.invalidate(f"user:{user_id}")
+        return user_id
+
+    @classmethod
+    async def get_credentials_by_email(cls, email: str, session: AsyncSession):
+        query = select(User.id, User.username, User.email, User.password).where(
+            func.lower(User.email) == func.lower(email)
+        )
         result = await session.execute(query)
-        return result.scalar_one_or_none()
+        return result.one_or_none()
 
     @classmethod
     async def get_user_by_id(cls, id: int, session: AsyncSession):
@@ -32,26 +93,390 @@ class UsersDAO:
         return result.scalar_one_or_none()
 
     @classmethod
-    async def get_user_records_by_id(cls, id: int, session: AsyncSession):
-        query = select(Record).filter_by(user_id=id).order_by(Record.created_at.desc())
+    async def get_user_records_by_id(
+        cls,
+        id: int,
+        session: AsyncSession,
+        limit: Optional[int] = None,
+        before: Optional[tuple[datetime, int]] = None,
+        since: Optional[datetime] = None,
+    ):
+        query = select(*record_columns()).filter_by(user_id=id)
+        if before is not None:
+            created_at, record_id = before
+            query = query.where(
+                # The plain range lets the planner skip newer partitions.
+                Record.created_at <= created_at,
+                or_(
+                    Record.created_at < created_at,
+                    and_(Record.created_at == created_at, Record.id > record_id),
+                ),
+            )
+        if since is not None:
+            query = query.where(Record.created_at >= naive_utc(since))
+        query = query.order_by(Record.created_at.desc(), Record.id).limit(limit)
         result = await session.execute(query)
-        return result.scalars().all()
+        return result.all()
+
+    @classmethod
+    def user_records_export_query(cls, id: int):
+        # Streams in ix_records_user_id_created_at_id order, without a sort.
+        return (
+            select(*record_columns())
+            .filter_by(user_id=id)
+            .order_by(Record.created_at.desc(), Record.id)
+        )
+
+    @classmethod
+    async def stream_user_records_by_id(
+        cls, id: int, session: AsyncSession, yield_per: int
+    ):
+        query = cls.user_records_export_query(id).execution_options(yield_per=yield_per)
+        return await session.stream(query)
 
 
 class RecordsDAO:
     @classmethod
-    async def get_records_by_id(cls, quiz_id: int, session: AsyncSession):
-        query = select(Record).filter_by(quiz_id=quiz_id).order_by(Record.score.desc())
+    async def get_records_by_id(
+        cls,
+        quiz_id: int,
+        session: AsyncSession,
+        limit: Optional[int] = None,
+        after: Optional[tuple[int, int]] = None,
+        best_per_user: bool = False,
+        since: Optional[datetime] = None,
+    ):
+        # Records are partitioned by created_at, `since` prunes older months.
+        period = [] if since is None else [Record.created_at >= naive_utc(since)]
+        records = Record
+        if best_per_user:
+            best = (
+                select(*record_columns())
+                .filter_by(quiz_id=quiz_id)
+                .where(*period)
+                .distinct(Record.user_id)
+                .order_by(Record.user_id, Record.score.desc(), Record.id)
+                .subquery()
+            )
+            records = aliased(Record, best)
+
+        query = select(*record_columns(records)).where(records.quiz_id == quiz_id)
+        if not best_per_user:
+            query = query.where(*period)
+        if after is not None:
+            score, id = after
+            query = query.where(
+                or_(
+                    records.score < score,
+                    and_(records.score == score, records.id > id),
+                )
+            )
+        query = query.order_by(records.score.desc(), records.id).limit(limit)
         result = await session.execute(query)
-        return result.scalars().all()
+        return result.all()
 
     @classmethod
-    async def add(cls, user: User, record_dict, session: AsyncSession):
-        new_instance = Record(user_id=user.__dict__["id"], **record_dict)
+    def records_export_query(cls, quiz_id: int):
+        # Streams in ix_records_quiz_id_score_id order: the first rows are sent
+        # before the whole quiz is read, and nothing is sorted in memory or on disk.
+        return (
+            select(*record_columns())
+            .filter_by(quiz_id=quiz_id)
+            .order_by(Record.score.desc(), Record.id)
+        )
+
+    @classmethod
+    async def stream_records_by_id(
+        cls, quiz_id: int, session: AsyncSession, yield_per: int
+    ):
+        query = cls.records_export_query(quiz_id).execution_options(yield_per=yield_per)
+        return await session.stream(query)
+
+    @classmethod
+    async def get_by_idempotency_key(
+        cls, user_id: int, key: str, session: AsyncSession
+    ):
+        keys = RecordIdempotencyKey
+        query = (
+            select(*record_columns())
+            .join(
+                keys,
+                and_(Record.id == keys.record_id, Record.created_at == keys.created_at),
+            )
+            .where(keys.user_id == user_id, keys.key == key)
+        )
+        result = await session.execute(query)
+        return result.one_or_none()
+
+    @classmethod
+    async def add(
+        cls,
+        user,
+        record_dict,
+        session: AsyncSession,
+        idempotency_key: Optional[str] = None,
+    ):
+        # Returns None when a concurrent request with the same idempotency key
+        # has stored its record first; this one is rolled back.
+        new_instance = Record(user_id=user.id, **record_dict)
         session.add(new_instance)
         try:
-            await session.commit()
+            with span("records_commit"):
+                await QuizStatsDAO.add_scores(
+                    [(new_instance.quiz_id, new_instance.score)], session
+                )
+                if idempotency_key is not None:
+                    await session.flush()
+                    claimed = await session.execute(
+                        pg_insert(RecordIdempotencyKey)
+                        .values(
+                            user_id=user.id,
+                            key=idempotency_key,
+                            record_id=new_instance.id,
+                            created_at=new_instance.created_at,
+                        )
+                        .on_conflict_do_nothing()
+                        .returning(RecordIdempotencyKey.record_id)
+                    )
+                    if claimed.first() is None:
+                        await session.rollback()
+                        return None
+                await session.commit()
         except SQLAlchemyError as e:
             await session.rollback()
             raise e
+        await response_cache.invalidate(
+            f"user:{user.id}", f"quiz:{new_instance.quiz_id}"
+        )
         return new_instance
+
+    @classmethod
+    async def get_best_score(cls, user_id: int, quiz_id: int, session: AsyncSession):
+        query = select(func.max(Record.score)).filter_by(
+            user_id=user_id, quiz_id=quiz_id
+        )
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def get_unnamed_quiz_ids(
+        cls, limit: int, session: AsyncSession, after: Optional[int] = None
+    ):
+        query = (
+            select(Record.quiz_id)
+            .where(or_(Record.quiz_name.is_(None), Record.quiz_name == ""))
+            .distinct()
+            .order_by(Record.quiz_id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(Record.quiz_id > after)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def set_quiz_names(cls, quiz_names: dict[int, str], session: AsyncSession):
+        records = Record.__table__
+        updated = (
+            update(records)
+            .where(
+                records.c.quiz_id.in_(quiz_names),
+                or_(records.c.quiz_name.is_(None), records.c.quiz_name == ""),
+            )
+            .values(quiz_name=case(quiz_names, value=records.c.quiz_id))
+            .returning(records.c.user_id)
+            .cte("updated")
+        )
+        # Only the pages of users whose records got a name are invalidated.
+        query = select(updated.c.user_id).distinct()
+        try:
+            result = await session.execute(query)
+            user_ids = result.scalars().all()
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        await response_cache.invalidate(
+            *(f"user:{user_id}" for user_id in user_ids),
+            *(f"quiz:{quiz_id}" for quiz_id in quiz_names),
+        )
+
+    @classmethod
+    async def add_many(cls, user, record_dicts: list[dict], session: AsyncSession):
+        query = insert(Record).returning(
+            *record_columns(), sort_by_parameter_order=True
+        )
+        params = [{"user_id": user.id, **record_dict} for record_dict in record_dicts]
+        try:
+            with span("records_commit"):
+                result = await session.execute(query, params)
+                new_instances = result.all()
+                await QuizStatsDAO.add_scores(
+                    [(record.quiz_id, record.score) for record in new_instances],
+                    session,
+                )
+                await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        await response_cache.invalidate(
+            f"user:{user.id}",
+            *{f"quiz:{record.quiz_id}" for record in new_instances},
+        )
+        return new_instances
+
+
+class QuizStatsDAO:
+    # Each row is one (quiz_id, score) pair of the inserted records with its
+    # count: the totals are incremented and a single histogram bucket is bumped.
+    upsert_query = text(
+        f"""
+        INSERT INTO {QuizStats.__tablename__} AS stats
+            (quiz_id, attempts, score_sum, best_score, histogram)
+        SELECT
+            quiz_id,
+            count,
+            score * count,
+            score,
+            array_fill(0::bigint, ARRAY[score])
+                || count
+                || array_fill(0::bigint, ARRAY[{SCORE_BUCKETS - 1} - score])
+        FROM (
+            VALUES (
+                CAST(:quiz_id AS INTEGER),
+                CAST(:score AS INTEGER),
+                CAST(:count AS BIGINT)
+            )
+        ) AS new (quiz_id, score, count)
+        ON CONFLICT (quiz_id) DO UPDATE SET
+            attempts = stats.attempts + excluded.attempts,
+            score_sum = stats.score_sum + excluded.score_sum,
+            best_score = greatest(stats.best_score, excluded.best_score),
+            histogram[excluded.best_score + 1] =
+                stats.histogram[excluded.best_score + 1] + excluded.attempts
+        """
+    )
+    rebuild_query = text(
+        f"""
+        WITH buckets AS (
+            SELECT quiz_id, score, count(*) AS count
+            FROM {Record.__tablename__}
+            WHERE CAST(:quiz_id AS INTEGER) IS NULL
+                OR quiz_id = CAST(:quiz_id AS INTEGER)
+            GROUP BY quiz_id, score
+        ),
+        quizzes AS (
+            SELECT
+                quiz_id,
+                sum(count) AS attempts,
+                sum(score * count) AS score_sum,
+                max(score) AS best_score
+            FROM buckets
+            GROUP BY quiz_id
+        )
+        INSERT INTO {QuizStats.__tablename__}
+            (quiz_id, attempts, score_sum, best_score, histogram)
+        SELECT
+            quiz.quiz_id,
+            quiz.attempts,
+            quiz.score_sum,
+            quiz.best_score,
+            array_agg(coalesce(bucket.count, 0) ORDER BY series.score)
+        FROM quizzes AS quiz
+        CROSS JOIN generate_series(0, {SCORE_BUCKETS - 1}) AS series (score)
+        LEFT JOIN buckets AS bucket
+            ON bucket.quiz_id = quiz.quiz_id AND bucket.score = series.score
+        GROUP BY quiz.quiz_id, quiz.attempts, quiz.score_sum, quiz.best_score
+        """
+    )
+
+    @classmethod
+    async def add_scores(cls, scores: Iterable[tuple[int, int]], session: AsyncSession):
+        params = [
+            {"quiz_id": quiz_id, "score": score, "count": count}
+            for (quiz_id, score), count in sorted(Counter(scores).items())
+        ]
+        if params:
+            await session.execute(cls.upsert_query, params)
+
+    @classmethod
+    async def get_stats(cls, quiz_id: int, session: AsyncSession):
+        query = select(QuizStats).filter_by(quiz_id=quiz_id)
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def rebuild(cls, session: AsyncSession, quiz_id: Optional[int] = None):
+        stats = QuizStats.__table__
+        delete_query = stats.delete()
+        if quiz_id is not None:
+            delete_query = delete_query.where(stats.c.quiz_id == quiz_id)
+        try:
+            # Block concurrent increments until the rebuilt rows are committed.
+            await session.execute(
+                text(f"LOCK TABLE {QuizStats.__tablename__} IN EXCLUSIVE MODE")
+            )
+            await session.execute(delete_query)
+            await session.execute(cls.rebuild_query, {"quiz_id": quiz_id})
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        if quiz_id is None:
+            await response_cache.invalidate("quizzes")
+        else:
+            await response_cache.invalidate(f"quiz:{quiz_id}")
+
+
+class PartitionsDAO:
+    @classmethod
+    async def get_partitions(cls, session: AsyncSession) -> list[str]:
+        result = await session.execute(text(list_partitions_query()))
+        return result.scalars().all()
+
+    @classmethod
+    async def create_partitions(cls, start: date, end: date, session: AsyncSession):
+        existing = set(await cls.get_partitions(session))
+        new_months = [
+            month
+            for month in months(start, end)
+            if partition_name(month) not in existing
+        ]
+        try:
+            for query in create_partitions_queries(new_months, existing):
+                await session.execute(text(query))
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        return [partition_name(month) for month in new_months]
+
+    @classmethod
+    async def detach_partitions(
+        cls, before: date, session: AsyncSession, drop: bool = False
+    ):
+        detached = [
+            name
+            for name in await cls.get_partitions(session)
+            if partition_month(name) is not None and partition_month(name) < before
+        ]
+        try:
+            for name in detached:
+                await session.execute(
+                    text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                )
+                if drop:
+                    await session.execute(text(f"DROP TABLE {name}"))
+            if detached:
+                # Keys of detached records can no longer be replayed.
+                await session.execute(
+                    delete(RecordIdempotencyKey).where(
+                        RecordIdempotencyKey.created_at
+                        < datetime(before.year, before.month, before.day)
+                    )
+                )
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            raise e
+        return detached
@@ -0,0 +1,59 @@
+import csv
+import io
+from typing import AsyncIterator, Awaitable, Callable, Literal
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession, async_sessionmaker
+
+EXPORT_CHUNK_SIZE = 1000
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def render_ndjson(keys, rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+
+def render_csv(keys, rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_chunks(
+    session_factory: async_sessionmaker,
+    stream: Callable[[AsyncSession], Awaitable[AsyncResult]],
+    export_format: ExportFormat,
+) -> AsyncIterator[bytes]:
+    async with session_factory() as session:
+        result = await stream(session)
+        keys = tuple(result.keys())
+        if export_format == "csv":
+            yield render_csv(keys, [keys])
+            render = render_csv
+        else:
+            render = render_ndjson
+        async for rows in result.partitions(EXPORT_CHUNK_SIZE):
+            yield render(keys, rows)
+
+
+def export_response(
+    session_factory: async_sessionmaker,
+    stream: Callable[[AsyncSession], Awaitable[AsyncResult]],
+    export_format: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_chunks(session_factory, stream, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
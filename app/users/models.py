@@ -1,17 +1,24 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sqlalchemy import func, ForeignKey
+from sqlalchemy import func, ForeignKey, Index, or_, BigInteger, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
+# RecordInput bounds scores to 0..99, one histogram bucket per score.
+SCORE_BUCKETS = 100
+
 
 class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str]
-    email: Mapped[str] = mapped_column(unique=True, nullable=False)
+    email: Mapped[str] = mapped_column(nullable=False)
     password: Mapped[str]
 
+    # Emails are unique case-insensitively; lookups compare lower(email).
+    __table_args__ = (Index("ix_users_lower_email", func.lower(email), unique=True),)
+
     def __str__(self):
         return (
             f"{self.__class__.__name__}(id={self.id}, " f"username={self.username!r},"
@@ -21,14 +28,47 @@ class User(Base):
         return str(self)
 
 
+def naive_utc(value: datetime) -> datetime:
+    # created_at is a TIMESTAMP without time zone holding UTC, and asyncpg can not
+    # compare it with an aware datetime.
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 class Record(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     user: Mapped["User"] = relationship("User", backref="records")
     quiz_id: Mapped[int]
     quiz_name: Mapped[str] = mapped_column(nullable=True)
-    score: Mapped[int]
-    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    score: Mapped[int] = mapped_column()
+    # Part of the primary key because records is partitioned by created_at.
+    created_at: Mapped[datetime] = mapped_column(
+        primary_key=True, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_records_user_id_created_at_id",
+            "user_id",
+            created_at.desc(),
+            "id",
+        ),
+        Index(
+            "ix_records_quiz_id_score_id",
+            "quiz_id",
+            score.desc(),
+            "id",
+            postgresql_include=["user_id", "quiz_name", "created_at"],
+        ),
+        Index(
+            "ix_records_unnamed_quiz_id",
+            "quiz_id",
+            postgresql_where=or_(quiz_name.is_(None), quiz_name == ""),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     def __str__(self):
         return (
@@ -40,3 +80,51 @@ class Record(Base):
 
     def __repr__(self):
         return str(self)
+
+
+class RecordIdempotencyKey(Base):
+    __tablename__ = "record_idempotency_keys"
+
+    # A unique (user_id, key) can not live on the partitioned records table,
+    # whose unique indexes must include created_at.
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    record_id: Mapped[int]
+    # created_at of the record, so the lookup is pruned to its partition.
+    created_at: Mapped[datetime]
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(user_id={self.user_id}, "
+            f"key={self.key!r},"
+            f"record_id={self.record_id!r}"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class QuizStats(Base):
+    __tablename__ = "quiz_stats"
+
+    quiz_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    attempts: Mapped[int] = mapped_column(BigInteger)
+    score_sum: Mapped[int] = mapped_column(BigInteger)
+    best_score: Mapped[int]
+    histogram: Mapped[list[int]] = mapped_column(ARRAY(BigInteger))
+
+    def rank(self, score: int) -> tuple[int, int]:
+        # Prefix sums over the histogram: attempts ranked above and below score.
+        higher = sum(self.histogram[score + 1 :])
+        lower = sum(self.histogram[:score])
+        return higher + 1, lower
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(quiz_id={self.quiz_id}, "
+            f"attempts={self.attempts!r},"
+            f"best_score={self.best_score!r}"
+        )
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,36 @@
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+K = TypeVar("K")
+
+
+def encode_cursor(key, id: int) -> str:
+    if hasattr(key, "isoformat"):
+        key = key.isoformat()
+    return f"{key}_{id}"
+
+
+def paginate(items, limit: int, cursor_key: Callable) -> tuple[list, Optional[str]]:
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(*cursor_key(items[-1]))
+
+
+def decode_cursor(
+    cursor: Optional[str], parse_key: Callable[[str], K]
+) -> Optional[tuple[K, int]]:
+    if cursor is None:
+        return None
+    try:
+        key, id = cursor.rsplit("_", 1)
+        return parse_key(key), int(id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Некорректный курсор",
+        )
@@ -0,0 +1,88 @@
+import re
+from datetime import date, datetime
+from typing import Iterator, Optional, Sequence, Union
+
+# Partitions of the records table: one per calendar month of created_at, plus a
+# default partition that catches rows outside the pre-created months.
+PARENT_TABLE = "records"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value: Union[date, datetime]) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months(start: date, end: date) -> Iterator[date]:
+    month = month_start(start)
+    while month <= end:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match[1]), int(match[2]), 1)
+
+
+def create_partition_query(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+
+
+def create_default_partition_query() -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        f"PARTITION OF {PARENT_TABLE} DEFAULT"
+    )
+
+
+def list_partitions_query() -> str:
+    return (
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+        f"WHERE pg_inherits.inhparent = '{PARENT_TABLE}'::regclass "
+        "ORDER BY child.relname"
+    )
+
+
+def create_partitions_queries(
+    new_months: Sequence[date], existing: set[str]
+) -> list[str]:
+    if DEFAULT_PARTITION not in existing:
+        return [
+            *map(create_partition_query, new_months),
+            create_default_partition_query(),
+        ]
+    if not new_months:
+        return []
+    # A month can not be attached while the default partition holds rows of it,
+    # so the default is detached, its rows of the new months are moved out and
+    # it is attached back.
+    queries = [f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"]
+    for month in new_months:
+        queries += [
+            create_partition_query(month),
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE created_at >= '{month}' AND created_at < '{add_months(month, 1)}' "
+            f"RETURNING *) INSERT INTO {partition_name(month)} SELECT * FROM moved",
+        ]
+    queries.append(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"
+    )
+    return queries
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from functools import cached_property
+from typing import Iterable, Optional
+
+from app.config import get_quiz_name_resolver_options, lazy_option
+from app.database import async_session
+from app.quiz_backend import quiz_backend
+from app.users.dao import RecordsDAO
+
+logger = logging.getLogger(__name__)
+
+
+class QuizNameResolver:
+    enabled = lazy_option(get_quiz_name_resolver_options, "enabled")
+    workers = lazy_option(get_quiz_name_resolver_options, "workers")
+    batch_size = lazy_option(get_quiz_name_resolver_options, "batch_size")
+    sweep_interval = lazy_option(get_quiz_name_resolver_options, "sweep_interval")
+
+    def __init__(self, session_factory=async_session, backend=quiz_backend):
+        self.session_factory = session_factory
+        self.backend = backend
+        self._tasks: list[asyncio.Task] = []
+        # Last quiz id seen by the sweep, so quiz ids that never resolve do not
+        # keep every sweep from reaching the ones after them.
+        self.sweep_after: Optional[int] = None
+
+    @cached_property
+    def queue(self) -> asyncio.Queue[tuple[int, int]]:
+        return asyncio.Queue(maxsize=get_quiz_name_resolver_options()["queue_size"])
+
+    def enqueue(self, record_id: int, quiz_id: int) -> None:
+        try:
+            self.queue.put_nowait((record_id, quiz_id))
+        except asyncio.QueueFull:
+            # The record keeps quiz_name NULL and is repaired by the sweep.
+            logger.warning("Quiz name queue is full, record %s deferred", record_id)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep_periodically()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def resolve(self, quiz_ids: Iterable[int]) -> dict[int, str]:
+        quiz_ids = list(set(quiz_ids))
+        names = await asyncio.gather(
+            *(self.backend.get_quiz_name(quiz_id) for quiz_id in quiz_ids),
+            return_exceptions=True,
+        )
+        quiz_names = {
+            quiz_id: name
+            for quiz_id, name in zip(quiz_ids, names)
+            if not isinstance(name, BaseException)
+        }
+        if quiz_names:
+            async with self.session_factory() as session:
+                await RecordsDAO.set_quiz_names(quiz_names, session)
+        return quiz_names
+
+    async def sweep(self) -> dict[int, str]:
+        async with self.session_factory() as session:
+            limit = self.batch_size * self.workers
+            quiz_ids = await RecordsDAO.get_unnamed_quiz_ids(
+                limit, session, after=self.sweep_after
+            )
+        # Start from the lowest quiz id again once the end is reached.
+        self.sweep_after = quiz_ids[-1] if len(quiz_ids) == limit else None
+        quiz_names = {}
+        for start in range(0, len(quiz_ids), self.batch_size):
+            batch = quiz_ids[start : start + self.batch_size]
+            quiz_names.update(await self.resolve(batch))
+        return quiz_names
+
+    async def _work(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self.resolve(quiz_id for _, quiz_id in batch)
+            except Exception:
+                logger.exception("Failed to resolve quiz names")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep unnamed records")
+            await asyncio.sleep(self.sweep_interval)
+
+
+quiz_name_resolver = QuizNameResolver()
@@ -1,34 +1,81 @@
 import asyncio
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-import httpx
-from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi import Response
-from sqlalchemy.ext.asyncio import AsyncSession
-from .models import User, Record
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query
+from fastapi import Request, Response
+from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from .models import Record
 from .schemas import (
     UserRegistration,
     UserAuth,
     AppResponse,
     UserReturn,
+    UserPrincipal,
     RecordInput,
+    RecordBatchInput,
     RecordReturn,
     AppResponseList,
+    AppResponsePage,
+    QuizStatsReturn,
+    QuizRankReturn,
 )
-from .dao import UsersDAO, RecordsDAO
-from .auth import get_password_hash, authenticate_user, create_access_token
-from ..dependencies import get_active_user, set_quiz_name, get_session
+from .dao import UsersDAO, RecordsDAO, QuizStatsDAO
+from .models import SCORE_BUCKETS, naive_utc
+from .auth import password_hasher, authenticate_user, create_access_token
+from .export import EXPORT_CHUNK_SIZE, ExportFormat, export_response
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, decode_cursor
+from .resolver import quiz_name_resolver
+from ..dependencies import (
+    get_active_user,
+    set_quiz_name,
+    set_quiz_names,
+    get_read_session,
+    get_read_session_factory,
+    get_session,
+    read_your_writes,
+)
+from ..quiz_backend import quiz_backend
+from ..rate_limit import limit_auth, limit_writes, write_slots
+from ..response_cache import cached_response
 
 router = APIRouter(prefix="/api/v1/users", tags=["Работа с пользователями"])
 
 
+def records_response(records, **extra) -> ORJSONResponse:
+    # Rows are selected column by column from the database, so they are trusted
+    # and rendered by orjson as is instead of being validated again.
+    keys = records[0]._fields if records else ()
+    data = [dict(zip(keys, record)) for record in records]
+    return ORJSONResponse({"data": data, **extra})
+
+
+def model_response(content: BaseModel) -> ORJSONResponse:
+    return ORJSONResponse(content.model_dump(mode="json"))
+
+
+def parse_created_at(key: str) -> datetime:
+    # Cursors are issued naive, but a client may send one with an offset.
+    return naive_utc(datetime.fromisoformat(key))
+
+
+def replayed_record(record, response: Response) -> AppResponse[RecordReturn]:
+    response.headers["Idempotent-Replayed"] = "true"
+    read_your_writes(response)
+    return AppResponse(data=RecordReturn.model_validate(record._asdict()))
+
+
 @router.get(
     "/{user_id}",
     summary="Получить пользователя по user_id",
+    response_model=AppResponse[UserReturn],
 )
+@cached_response("user:{user_id}")
 async def get_records_by_user_id(
-    user_id: int, session: AsyncSession = Depends(get_session)
-) -> AppResponse[UserReturn]:
+    request: Request, user_id: int, session: AsyncSession = Depends(get_read_session)
+) -> ORJSONResponse:
     user = await UsersDAO.get_user_by_id(user_id, session)
 
     if not user:
@@ -36,35 +83,105 @@ async def get_records_by_user_id(
             status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
         )
 
-    return AppResponse(data=UserReturn.model_validate(user.__dict__))
+    return model_response(AppResponse(data=UserReturn.model_validate(user.__dict__)))
 
 
-@router.get("/{user_id}/records", summary="Получить записи пользователя по user_id")
+@router.get(
+    "/{user_id}/records",
+    summary="Получить записи пользователя по user_id",
+    response_model=AppResponsePage[RecordReturn],
+)
+@cached_response("user:{user_id}")
 async def get_records_by_student_id(
-    user_id: int, session: AsyncSession = Depends(get_session)
-) -> AppResponseList[RecordReturn]:
-    records = await UsersDAO.get_user_records_by_id(user_id, session)
-    return AppResponseList(
-        data=[RecordReturn.model_validate(record.__dict__) for record in records]
+    request: Request,
+    user_id: int,
+    limit: int = Query(
+        DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"
+    ),
+    before: Optional[str] = Query(None, description="Курсор следующей страницы"),
+    since: Optional[datetime] = Query(
+        None, description="Только записи, созданные не раньше этого момента"
+    ),
+    session: AsyncSession = Depends(get_read_session),
+) -> ORJSONResponse:
+    records = await UsersDAO.get_user_records_by_id(
+        user_id,
+        session,
+        limit=limit + 1,
+        before=decode_cursor(before, parse_created_at),
+        since=since,
+    )
+    records, next_cursor = paginate(
+        records, limit, lambda record: (record.created_at, record.id)
     )
+    return records_response(records, next_cursor=next_cursor)
 
 
-@router.post(":register/", summary="Зарегистрировать пользователя")
+@router.get(
+    "/{user_id}/records/export",
+    summary="Выгрузить все записи пользователя по user_id",
+    response_class=StreamingResponse,
+)
+async def export_user_records(
+    user_id: int,
+    export_format: ExportFormat = Query(
+        "ndjson", alias="format", description="Формат выгрузки"
+    ),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory),
+) -> StreamingResponse:
+    return export_response(
+        session_factory,
+        lambda session: UsersDAO.stream_user_records_by_id(
+            user_id, session, yield_per=EXPORT_CHUNK_SIZE
+        ),
+        export_format,
+        f"user-{user_id}-records",
+    )
+
+
+@router.get(
+    "/{user_id}/records/{quiz_id}/rank",
+    summary="Получить место лучшего результата пользователя в квизе",
+    response_model=AppResponse[QuizRankReturn],
+)
+@cached_response("user:{user_id}", "quizzes", "quiz:{quiz_id}")
+async def get_user_quiz_rank(
+    request: Request,
+    user_id: int,
+    quiz_id: int,
+    session: AsyncSession = Depends(get_read_session),
+) -> ORJSONResponse:
+    score = await RecordsDAO.get_best_score(user_id, quiz_id, session)
+    if score is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="У пользователя нет записей в этом квизе",
+        )
+    return model_response(AppResponse(data=await get_rank(quiz_id, score, session)))
+
+
+@router.post(
+    ":register/",
+    summary="Зарегистрировать пользователя",
+    dependencies=[Depends(limit_auth)],
+)
 async def add_user(
     user_data: UserRegistration, session: AsyncSession = Depends(get_session)
 ):
-    user = await UsersDAO.get_user_by_email(user_data.email, session)
-    if user:
+    user_dict = user_data.model_dump()
+    user_dict["password"] = await password_hasher.hash(user_data.password)
+    if await UsersDAO.register(user_dict, session) is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Пользователь уже существует"
         )
-    user_dict = user_data.model_dump()
-    user_dict["password"] = get_password_hash(user_data.password)
-    await UsersDAO.add(user_dict, session)
     return {"message": "Вы успешно зарегистрированы!"}
 
 
-@router.post(":login/", summary="Авторизовать пользователя")
+@router.post(
+    ":login/",
+    summary="Авторизовать пользователя",
+    dependencies=[Depends(limit_auth)],
+)
 async def auth_user(
     response: Response,
     user_data: UserAuth,
@@ -77,7 +194,9 @@ async def auth_user(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверная почта или пароль"
         )
-    access_token = create_access_token({"sub": str(check.id)})
+    access_token = create_access_token(
+        {"sub": str(check.id), "username": check.username, "email": check.email}
+    )
     response.set_cookie(
         key="users_access_token",
         value=access_token,
@@ -90,36 +209,106 @@ async def auth_user(
 
 @router.get(":current-user/", summary="Получить действующего пользователя")
 async def get_current_user(
-    user_data: User = Depends(get_active_user),
+    user_data: UserPrincipal = Depends(get_active_user),
 ) -> AppResponse[UserReturn]:
     return AppResponse(data=UserReturn.model_validate(user_data.__dict__))
 
 
-@router.get(":current-user/records", summary="Получить записи пользователя по user_id")
+@router.get(
+    ":current-user/records",
+    summary="Получить записи пользователя по user_id",
+    response_model=AppResponsePage[RecordReturn],
+)
 async def get_records_by_student_id(
-    user_data: User = Depends(get_active_user),
-    session: AsyncSession = Depends(get_session),
-) -> AppResponseList[RecordReturn]:
-    records = await UsersDAO.get_user_records_by_id(user_data.__dict__["id"], session)
-    return AppResponseList(
-        data=[RecordReturn.model_validate(record.__dict__) for record in records]
+    limit: int = Query(
+        DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"
+    ),
+    before: Optional[str] = Query(None, description="Курсор следующей страницы"),
+    since: Optional[datetime] = Query(
+        None, description="Только записи, созданные не раньше этого момента"
+    ),
+    user_data: UserPrincipal = Depends(get_active_user),
+    session: AsyncSession = Depends(get_read_session),
+) -> ORJSONResponse:
+    records = await UsersDAO.get_user_records_by_id(
+        user_data.id,
+        session,
+        limit=limit + 1,
+        before=decode_cursor(before, parse_created_at),
+        since=since,
+    )
+    records, next_cursor = paginate(
+        records, limit, lambda record: (record.created_at, record.id)
     )
+    return records_response(records, next_cursor=next_cursor)
 
 
 @router.post(
-    ":current-user/records", summary="Добавить запись действующему пользователю"
+    ":current-user/records",
+    summary="Добавить запись действующему пользователю",
+    dependencies=[Depends(limit_writes), Depends(write_slots)],
 )
 async def get_records_by_student_id(
     record: RecordInput,
-    user_data: User = Depends(get_active_user),
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None,
+        max_length=255,
+        description="Ключ попытки: повтор с тем же ключом вернёт сохранённую запись",
+    ),
+    user_data: UserPrincipal = Depends(get_active_user),
     session: AsyncSession = Depends(get_session),
 ) -> AppResponse[RecordReturn]:
+    if idempotency_key is not None:
+        stored = await RecordsDAO.get_by_idempotency_key(
+            user_data.id, idempotency_key, session
+        )
+        if stored is not None:
+            return replayed_record(stored, response)
+
     record_dict = record.model_dump()
-    await set_quiz_name(record_dict)
-    new_record = await RecordsDAO.add(user_data, record_dict, session)
+    if quiz_name_resolver.enabled:
+        record_dict["quiz_name"] = quiz_backend.names.peek(record.quiz_id)
+    else:
+        await set_quiz_name(record_dict)
+    new_record = await RecordsDAO.add(
+        user_data, record_dict, session, idempotency_key=idempotency_key
+    )
+    if new_record is None:
+        stored = await RecordsDAO.get_by_idempotency_key(
+            user_data.id, idempotency_key, session
+        )
+        return replayed_record(stored, response)
+    if new_record.quiz_name is None:
+        quiz_name_resolver.enqueue(new_record.id, new_record.quiz_id)
+    read_your_writes(response)
     return AppResponse(data=RecordReturn.model_validate(new_record.__dict__))
 
 
+@router.post(
+    ":current-user/records:batch",
+    summary="Добавить несколько записей действующему пользователю",
+    response_model=AppResponseList[RecordReturn],
+    dependencies=[Depends(limit_writes), Depends(write_slots)],
+)
+async def add_records_batch(
+    batch: RecordBatchInput,
+    user_data: UserPrincipal = Depends(get_active_user),
+    session: AsyncSession = Depends(get_session),
+) -> ORJSONResponse:
+    record_dicts = [record.model_dump() for record in batch.records]
+    if quiz_name_resolver.enabled:
+        for record_dict in record_dicts:
+            record_dict["quiz_name"] = quiz_backend.names.peek(record_dict["quiz_id"])
+    else:
+        await set_quiz_names(record_dicts)
+    new_records = await RecordsDAO.add_many(user_data, record_dicts, session)
+    for new_record in new_records:
+        if new_record.quiz_name is None:
+            quiz_name_resolver.enqueue(new_record.id, new_record.quiz_id)
+    return read_your_writes(records_response(new_records))
+
+
 @router.post(":logout/", summary="Деактивировать действующего пользователя")
 async def logout_user(response: Response):
     response.delete_cookie(key="users_access_token")
@@ -129,11 +318,126 @@ async def logout_user(response: Response):
 router_records = APIRouter(prefix="/api/v1/records", tags=["Работа с записями"])
 
 
-@router_records.get("/{quiz_id}", summary="Получить записи квиза по quiz_id")
+@router_records.get(
+    "/{quiz_id}",
+    summary="Получить записи квиза по quiz_id",
+    response_model=AppResponsePage[RecordReturn],
+)
+@cached_response("quizzes", "quiz:{quiz_id}")
 async def get_records_by_quiz_id(
-    quiz_id: int, session: AsyncSession = Depends(get_session)
-) -> AppResponseList[RecordReturn]:
-    records = await RecordsDAO.get_records_by_id(quiz_id, session)
-    return AppResponseList(
-        data=[RecordReturn.model_validate(record.__dict__) for record in records]
+    request: Request,
+    quiz_id: int,
+    limit: int = Query(
+        DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"
+    ),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы"),
+    since: Optional[datetime] = Query(
+        None, description="Только записи, созданные не раньше этого момента"
+    ),
+    best_per_user: bool = Query(
+        False, description="Только лучший результат каждого пользователя"
+    ),
+    session: AsyncSession = Depends(get_read_session),
+) -> ORJSONResponse:
+    records = await RecordsDAO.get_records_by_id(
+        quiz_id,
+        session,
+        limit=limit + 1,
+        after=decode_cursor(cursor, int),
+        best_per_user=best_per_user,
+        since=since,
     )
+    records, next_cursor = paginate(
+        records, limit, lambda record: (record.score, record.id)
+    )
+    return records_response(records, next_cursor=next_cursor)
+
+
+@router_records.get(
+    "/{quiz_id}/export",
+    summary="Выгрузить все записи квиза по quiz_id",
+    response_class=StreamingResponse,
+)
+async def export_quiz_records(
+    quiz_id: int,
+    export_format: ExportFormat = Query(
+        "ndjson", alias="format", description="Формат выгрузки"
+    ),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory),
+) -> StreamingResponse:
+    return export_response(
+        session_factory,
+        lambda session: RecordsDAO.stream_records_by_id(
+            quiz_id, session, yield_per=EXPORT_CHUNK_SIZE
+        ),
+        export_format,
+        f"quiz-{quiz_id}-records",
+    )
+
+
+@router_records.get(
+    "/{quiz_id}/stats",
+    summary="Получить статистику квиза по quiz_id",
+    response_model=AppResponse[QuizStatsReturn],
+)
+@cached_response("quizzes", "quiz:{quiz_id}")
+async def get_quiz_stats(
+    request: Request, quiz_id: int, session: AsyncSession = Depends(get_read_session)
+) -> ORJSONResponse:
+    stats = await QuizStatsDAO.get_stats(quiz_id, session)
+    if not stats:
+        return model_response(
+            AppResponse(
+                data=QuizStatsReturn(
+                    quiz_id=quiz_id,
+                    attempts=0,
+                    average_score=None,
+                    best_score=None,
+                    histogram=[0] * SCORE_BUCKETS,
+                )
+            )
+        )
+
+    return model_response(
+        AppResponse(
+            data=QuizStatsReturn(
+                quiz_id=quiz_id,
+                attempts=stats.attempts,
+                average_score=stats.score_sum / stats.attempts,
+                best_score=stats.best_score,
+                histogram=stats.histogram,
+            )
+        )
+    )
+
+
+async def get_rank(quiz_id: int, score: int, session: AsyncSession) -> QuizRankReturn:
+    stats = await QuizStatsDAO.get_stats(quiz_id, session)
+    if not stats:
+        return QuizRankReturn(
+            quiz_id=quiz_id, score=score, rank=1, attempts=0, percentile=0
+        )
+
+    rank, lower = stats.rank(score)
+    return QuizRankReturn(
+        quiz_id=quiz_id,
+        score=score,
+        rank=rank,
+        attempts=stats.attempts,
+        percentile=lower * 100 / stats.attempts,
+    )
+
+
+@router_records.get(
+    "/{quiz_id}/rank",
+    summary="Получить место результата в квизе по quiz_id",
+    response_model=AppResponse[QuizRankReturn],
+)
+@cached_response("quizzes", "quiz:{quiz_id}")
+async def get_quiz_rank(
+    request: Request,
+    quiz_id: int,
+    score: int = Query(..., ge=0, le=SCORE_BUCKETS - 1, description="Счёт в %"),
+    session: AsyncSession = Depends(get_read_session),
+) -> ORJSONResponse:
+    return model_response(AppResponse(data=await get_rank(quiz_id, score, session)))
@@ -1,10 +1,12 @@
 from datetime import datetime
 from typing import TypeVar, Generic, List, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 T = TypeVar("T", bound=BaseModel)
 
+MAX_RECORD_BATCH_SIZE = 500
+
 
 class UserRegistration(BaseModel):
     username: str = Field(
@@ -28,6 +30,15 @@ class RecordInput(BaseModel):
     score: int = Field(..., ge=0, le=99, description="Счёт в %")
 
 
+class RecordBatchInput(BaseModel):
+    records: List[RecordInput] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_RECORD_BATCH_SIZE,
+        description=f"Записи, не более {MAX_RECORD_BATCH_SIZE}",
+    )
+
+
 class RecordReturn(BaseModel):
     id: int
     user_id: int
@@ -41,6 +52,24 @@ class RecordReturnList:
     record = List[RecordReturn]
 
 
+class QuizStatsReturn(BaseModel):
+    quiz_id: int = Field(..., description="Id квиза")
+    attempts: int = Field(..., description="Количество попыток")
+    average_score: Optional[float] = Field(..., description="Средний счёт в %")
+    best_score: Optional[int] = Field(..., description="Лучший счёт в %")
+    histogram: List[int] = Field(
+        ..., description="Количество попыток с каждым счётом от 0 до 99"
+    )
+
+
+class QuizRankReturn(BaseModel):
+    quiz_id: int = Field(..., description="Id квиза")
+    score: int = Field(..., description="Счёт в %")
+    rank: int = Field(..., description="Место среди всех попыток")
+    attempts: int = Field(..., description="Количество попыток")
+    percentile: float = Field(..., description="Процент попыток с меньшим счётом")
+
+
 class UserReturn(BaseModel):
     username: str = Field(
         ..., min_length=2, max_length=20, description="Имя пользователя"
@@ -49,9 +78,24 @@ class UserReturn(BaseModel):
     id: int
 
 
+class UserPrincipal(BaseModel):
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+
+
 class AppResponse(BaseModel, Generic[T]):
     data: T
 
 
 class AppResponseList(BaseModel, Generic[T]):
     data: List[T]
+
+
+class AppResponsePage(BaseModel, Generic[T]):
+    data: List[T]
+    next_cursor: Optional[str] = Field(
+        None, description="Курсор следующей страницы, null если страниц больше нет"
+    )
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from app.database import async_session, get_engine
+from app.main import app
+from app.quiz_backend import quiz_backend
+from app.rate_limit import rate_limiter
+from app.response_cache import response_cache
+from app.users.auth import create_access_token, password_hasher
+from app.users.dao import QuizStatsDAO
+from app.users.models import QuizStats, Record, User
+
+BASELINE = Path(__file__).with_name("baseline.json")
+EMAIL_DOMAIN = "benchmark.quizm.ru"
+QUIZ_ID_BASE = 1_900_000_000
+RECORD_QUIZ_ID_BASE = QUIZ_ID_BASE + 1000
+SEED_USERS = 1000
+SEED_CHUNK_SIZE = 5000
+
+
+def stub_quiz_backend(request: httpx.Request) -> httpx.Response:
+    quiz_id = request.url.path.rsplit("/", 1)[-1]
+    return httpx.Response(200, json={"name": f"Quiz {quiz_id}"})
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+async def run_scenario(
+    send: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    latencies = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in numbers:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "rps": requests / elapsed,
+    }
+
+
+async def cleanup():
+    async with async_session() as session:
+        users = select(User.id).where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+        await session.execute(delete(Record).where(Record.user_id.in_(users)))
+        await session.execute(delete(User).where(User.email.like(f"%@{EMAIL_DOMAIN}")))
+        await session.execute(
+            delete(QuizStats).where(QuizStats.quiz_id >= QUIZ_ID_BASE)
+        )
+        await session.commit()
+
+
+async def seed_leaderboards(sizes: list[int]) -> list[int]:
+    async with async_session() as session:
+        result = await session.execute(
+            insert(User).returning(User.id),
+            [
+                {
+                    "username": f"seed{i}",
+                    "email": f"seed{i}@{EMAIL_DOMAIN}",
+                    "password": "-",
+                }
+                for i in range(SEED_USERS)
+            ],
+        )
+        user_ids = result.scalars().all()
+
+        quiz_ids = []
+        for size in sizes:
+            quiz_id = QUIZ_ID_BASE + len(quiz_ids)
+            records = [
+                {
+                    "user_id": random.choice(user_ids),
+                    "quiz_id": quiz_id,
+                    "quiz_name": f"Quiz {quiz_id}",
+                    "score": random.randrange(100),
+                }
+                for _ in range(size)
+            ]
+            for start in range(0, size, SEED_CHUNK_SIZE):
+                await session.execute(
+                    insert(Record), records[start : start + SEED_CHUNK_SIZE]
+                )
+            await session.commit()
+            await QuizStatsDAO.rebuild(session, quiz_id=quiz_id)
+            quiz_ids.append(quiz_id)
+        return quiz_ids
+
+
+async def run(args) -> dict:
+    results = {}
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    )
+    requests, concurrency = args.requests, args.concurrency
+
+    async def register(i: int) -> httpx.Response:
+        return await client.post(
+            "/api/v1/users:register/",
+            json={
+                "username": f"register{i}",
+                "email": f"register{i}@{EMAIL_DOMAIN}",
+                "password": "12s34f5g6",
+            },
+        )
+
+    results["register"] = await run_scenario(
+        register, args.bcrypt_requests, concurrency
+    )
+
+    async def login(i: int) -> httpx.Response:
+        return await client.post(
+            "/api/v1/users:login/",
+            json={
+                "email": f"register{i % args.bcrypt_requests}@{EMAIL_DOMAIN}",
+                "password": "12s34f5g6",
+            },
+        )
+
+    results["login"] = await run_scenario(login, args.bcrypt_requests, concurrency)
+
+    async with async_session() as session:
+        user = (
+            await session.execute(
+                select(User).where(User.email == f"register0@{EMAIL_DOMAIN}")
+            )
+        ).scalar_one()
+    client.cookies.set(
+        "users_access_token",
+        create_access_token(
+            {"sub": str(user.id), "username": user.username, "email": user.email}
+        ),
+    )
+
+    async def current_user(i: int) -> httpx.Response:
+        return await client.get("/api/v1/users:current-user/")
+
+    results["current_user"] = await run_scenario(current_user, requests, concurrency)
+
+    async def add_record(i: int) -> httpx.Response:
+        return await client.post(
+            "/api/v1/users:current-user/records",
+            json={"quiz_id": RECORD_QUIZ_ID_BASE + i % 10, "score": i % 100},
+        )
+
+    results["add_record"] = await run_scenario(add_record, requests, concurrency)
+
+    async def current_user_records(i: int) -> httpx.Response:
+        return await client.get("/api/v1/users:current-user/records")
+
+    results["current_user_records"] = await run_scenario(
+        current_user_records, requests, concurrency
+    )
+
+    client.cookies.clear()
+    quiz_ids = await seed_leaderboards(args.sizes)
+    for size, quiz_id in zip(args.sizes, quiz_ids):
+
+        async def leaderboard(i: int) -> httpx.Response:
+            return await client.get(f"/api/v1/records/{quiz_id}")
+
+        async def best_per_user(i: int) -> httpx.Response:
+            return await client.get(
+                f"/api/v1/records/{quiz_id}", params={"best_per_user": True}
+            )
+
+        results[f"leaderboard_{size}"] = await run_scenario(
+            leaderboard, requests, concurrency
+        )
+        results[f"leaderboard_best_{size}"] = await run_scenario(
+            best_per_user, requests, concurrency
+        )
+
+    await client.aclose()
+    return results
+
+
+def report(results: dict, baseline: dict, tolerance: float) -> bool:
+    print(
+        f"{'scenario':<26} {'req':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'rps':>8} {'p95 vs base':>12} {'rps vs base':>12}"
+    )
+    regressed = False
+    for name, result in results.items():
+        line = (
+            f"{name:<26} {result['requests']:>5} {result['errors']:>4} "
+            f"{result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f} "
+            f"{result['rps']:>8.1f}"
+        )
+        base = baseline.get(name)
+        if base:
+            p95_change = result["p95"] / base["p95"] - 1
+            rps_change = result["rps"] / base["rps"] - 1
+            line += f" {p95_change:>+11.0%} {rps_change:>+11.0%}"
+            if p95_change > tolerance or rps_change < -tolerance:
+                regressed = True
+                line += "  REGRESSION"
+        print(line)
+    return regressed
+
+
+async def main(args) -> int:
+    quiz_backend.start(transport=httpx.MockTransport(stub_quiz_backend))
+    if not args.response_cache:
+        response_cache.backend = None
+    if not args.rate_limit:
+        # Every benchmark request comes from one client address.
+        rate_limiter.backend = None
+    try:
+        await cleanup()
+        results = await run(args)
+    finally:
+        await cleanup()
+        await quiz_backend.close()
+        password_hasher.shutdown()
+        await get_engine().dispose()
+
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(results, indent=2) + "\n")
+        baseline = {}
+    else:
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    regressed = report(results, baseline, args.tolerance)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure latency and throughput of the API against local Postgres"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--bcrypt-requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--response-cache", action="store_true")
+    parser.add_argument("--rate-limit", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from app.users.models import Record
+from app.users.router import records_response
+from app.users.schemas import AppResponsePage, RecordReturn
+
+COLUMNS = ["id", "user_id", "quiz_id", "quiz_name", "score", "created_at"]
+
+
+def make_values(size: int) -> list[tuple]:
+    created_at = datetime(2025, 4, 11, 19, 13, 30, 242933)
+    return [(i, i % 97, 1, "Quiz name", i % 100, created_at) for i in range(size)]
+
+
+async def render_orm(records, response_field) -> bytes:
+    # The previous path: ORM objects -> model_validate(__dict__) -> FastAPI
+    # re-validates the return value against the response model -> json.dumps.
+    content = AppResponsePage(
+        data=[RecordReturn.model_validate(record.__dict__) for record in records],
+        next_cursor=None,
+    )
+    content = await serialize_response(field=response_field, response_content=content)
+    return JSONResponse(content).body
+
+
+async def render_rows(rows) -> bytes:
+    return records_response(rows, next_cursor=None).body
+
+
+async def measure(render, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await render()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main(sizes: list[int], repeat: int):
+    response_field = create_model_field(
+        name="Response", type_=AppResponsePage[RecordReturn], mode="serialization"
+    )
+    print(
+        f"{'records':>8} {'orm+pydantic, ms':>18} {'rows+orjson, ms':>17} {'speedup':>8}"
+    )
+    for size in sizes:
+        values = make_values(size)
+        records = [Record(**dict(zip(COLUMNS, value))) for value in values]
+        rows = IteratorResult(SimpleResultMetaData(COLUMNS), iter(values)).all()
+
+        old = await measure(lambda: render_orm(records, response_field), repeat)
+        new = await measure(lambda: render_rows(rows), repeat)
+        print(f"{size:>8} {old * 1000:>18.2f} {new * 1000:>17.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare record list serialization paths"
+    )
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main([int(size) for size in args.sizes.split(",")], args.repeat))